@@ -0,0 +1,227 @@
+# L1_corporate_actions.py
+#
+# Description:
+# Per-symbol table of corporate actions (splits, bonuses and dividends) for the
+# L1 price files. The L1 CSVs keep prices as traded; splits that happen after a
+# file was first downloaded would otherwise show up as fake -50% "returns".
+# Adjusted prices are derived on read by multiplying every row before an
+# action's ex-date by that action's factor, so nothing has to be re-downloaded.
+#
+# Each symbol's table lives in <L1 data folder>/corporate_actions/SYMBOL.csv
+# with columns DATE (ex-date), ACTION, VALUE and FACTOR:
+# - split:    VALUE is the ratio (2 for 1:2 or a 1:1 bonus), FACTOR is 1 / ratio
+# - dividend: VALUE is the amount, FACTOR is 1 - amount / previous close
+#
+# Usage:
+# 1. Record a split that happened before the data was downloaded incrementally:
+#    python L1_corporate_actions.py --symbol RELIANCE --split 2024-10-28 2
+#
+# 2. Show a symbol's actions:
+#    python L1_corporate_actions.py --symbol RELIANCE
+#
+
+import os
+import glob
+import argparse
+import numpy as np
+import pandas as pd
+
+import L1_file_tracking as tracking
+
+ACTIONS_SUBFOLDER = "corporate_actions"
+ACTION_COLUMNS = ['DATE', 'ACTION', 'VALUE', 'FACTOR']
+SPLIT = "split"
+DIVIDEND = "dividend"
+
+# Seasonality is measured on price returns; set to True to also back-adjust for dividends
+ADJUST_FOR_DIVIDENDS = False
+
+PRICE_COLUMNS = ['OPEN', 'HIGH', 'LOW', 'CLOSE']
+
+def actions_path(data_folder, symbol):
+    return os.path.join(data_folder, ACTIONS_SUBFOLDER, f"{symbol}.csv")
+
+def actions_fingerprint(data_folder, symbol):
+    """Content fingerprint (size and CRC32) of a symbol's action table, or None if it has none."""
+    path = actions_path(data_folder, symbol)
+    if not os.path.exists(path):
+        return None
+    fingerprint = tracking.file_fingerprint(path)
+    return {'size': fingerprint['size'], 'crc32': fingerprint['crc32']}
+
+def actions_changed(previous, current):
+    """
+    True if a symbol's action table has different content than when previous was taken.
+    Only content counts: record_actions never rewrites an unchanged table, so touching
+    or copying the table does not mark the symbol dirty.
+    """
+    def _content(fingerprint):
+        return (fingerprint['size'], fingerprint['crc32']) if fingerprint else None
+    return _content(previous) != _content(current)
+
+def load_actions(data_folder, symbol):
+    path = actions_path(data_folder, symbol)
+    if not os.path.exists(path):
+        return pd.DataFrame(columns=ACTION_COLUMNS)
+    actions = pd.read_csv(path)
+    actions['DATE'] = pd.to_datetime(actions['DATE'])
+    return actions
+
+def _actions_csv(actions):
+    actions = actions.assign(DATE=pd.to_datetime(actions['DATE']).dt.strftime('%Y-%m-%d'))
+    return actions[ACTION_COLUMNS].to_csv(index=False)
+
+def save_actions(actions, data_folder, symbol):
+    path = actions_path(data_folder, symbol)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(_actions_csv(actions))
+    os.replace(tmp_path, path)
+
+def record_actions(data_folder, symbol, new_actions, replace=False):
+    """
+    Merges new_actions into the symbol's table (or replaces it). An action on the
+    same ex-date as an existing one of the same kind overwrites it. The file is only
+    rewritten when something changed, so downstream results stay valid otherwise.
+    Returns True if the table changed.
+    """
+    existing = load_actions(data_folder, symbol)
+    new_actions = pd.DataFrame(new_actions, columns=ACTION_COLUMNS)
+    new_actions['DATE'] = pd.to_datetime(new_actions['DATE'])
+
+    if replace:
+        merged = new_actions
+    else:
+        merged = pd.concat([existing, new_actions], ignore_index=True)
+    merged = (merged.drop_duplicates(subset=['DATE', 'ACTION'], keep='last')
+                    .sort_values(['DATE', 'ACTION'])
+                    .reset_index(drop=True))
+
+    path = actions_path(data_folder, symbol)
+    if os.path.exists(path):
+        with open(path) as f:
+            if f.read() == _actions_csv(merged):
+                return False
+    elif merged.empty:
+        return False
+    save_actions(merged, data_folder, symbol)
+    return True
+
+def cumulative_factors(dates, event_dates, event_factors):
+    """
+    For every date, the product of the factors of all events with a later ex-date.
+    A row on or after an ex-date is not affected by that event.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    event_dates = np.asarray(event_dates, dtype='datetime64[D]')
+    event_factors = np.asarray(event_factors, dtype=float)
+    order = np.argsort(event_dates)
+    event_dates, event_factors = event_dates[order], event_factors[order]
+    # suffix[i] = product of factors of events i..end, with a trailing 1 for "no later event"
+    suffix = np.append(np.cumprod(event_factors[::-1])[::-1], 1.0)
+    return suffix[np.searchsorted(event_dates, dates, side='right')]
+
+def adjust_prices(df, actions, dividends=ADJUST_FOR_DIVIDENDS):
+    """
+    Returns a copy of df with OPEN/HIGH/LOW/CLOSE back-adjusted for the given actions
+    (and VOLUME for splits). df has either a DATE column or a DatetimeIndex.
+    """
+    kinds = [SPLIT, DIVIDEND] if dividends else [SPLIT]
+    actions = actions[actions['ACTION'].isin(kinds)]
+    if actions.empty or df.empty:
+        return df.copy()
+
+    dates = pd.to_datetime(df['DATE']) if 'DATE' in df.columns else df.index
+    df = df.copy()
+    price_factor = cumulative_factors(dates, actions['DATE'], actions['FACTOR'])
+    for column in PRICE_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].to_numpy(dtype=float) * price_factor
+    if 'VOLUME' in df.columns:
+        splits = actions[actions['ACTION'] == SPLIT]
+        volume_factor = cumulative_factors(dates, splits['DATE'], splits['FACTOR'])
+        df['VOLUME'] = df['VOLUME'].to_numpy(dtype=float) / volume_factor
+    return df
+
+def split_action(date, ratio):
+    return {'DATE': date, 'ACTION': SPLIT, 'VALUE': ratio, 'FACTOR': 1.0 / ratio}
+
+def dividend_action(date, amount, previous_close):
+    return {'DATE': date, 'ACTION': DIVIDEND, 'VALUE': amount, 'FACTOR': 1.0 - amount / previous_close}
+
+def unadjust_fetched_history(history, include_dividends=True):
+    """
+    Yahoo returns the rows of a download split-adjusted up to its last row. For an
+    incremental download appended to a file of as-traded prices, this undoes the
+    adjustment of rows before a split inside the downloaded window (dividend amounts
+    included), so the appended rows are as traded too.
+    """
+    splits = history[history['Stock Splits'] > 0]
+    if splits.empty:
+        return history
+    history = history.copy()
+    undo = 1.0 / cumulative_factors(history['DATE'], splits['DATE'], 1.0 / splits['Stock Splits'])
+    for column in PRICE_COLUMNS + (['Dividends'] if include_dividends else []):
+        history[column] = history[column].to_numpy(dtype=float) * undo
+    history['VOLUME'] = history['VOLUME'].to_numpy(dtype=float) / undo
+    return history
+
+def extract_actions(history, previous_close=np.nan, include_splits=True):
+    """
+    Reads split and dividend events from a yfinance history (with DATE/CLOSE, 'Dividends'
+    and 'Stock Splits' columns). previous_close is the close before the first row.
+    Splits are skipped for full-history downloads, whose prices Yahoo already split-adjusted.
+    """
+    actions = []
+    closes = history['CLOSE'].to_numpy(dtype=float)
+    previous = np.concatenate([[previous_close], closes[:-1]])
+    for i, (date, dividend, ratio) in enumerate(zip(history['DATE'], history['Dividends'], history['Stock Splits'])):
+        if include_splits and ratio > 0 and ratio != 1:
+            actions.append(split_action(date, ratio))
+        if dividend > 0 and np.isfinite(previous[i]) and previous[i] > dividend:
+            actions.append(dividend_action(date, dividend, previous[i]))
+    return actions
+
+def load_adjusted_prices(stock_file, data_folder, dividends=ADJUST_FOR_DIVIDENDS):
+    """Reads an L1 file with DATE parsed and prices adjusted for the symbol's actions."""
+    df = pd.read_csv(os.path.join(data_folder, stock_file))
+    df['DATE'] = pd.to_datetime(df['DATE'])
+    symbol = stock_file.replace('.csv', '').split(' - ')[0]
+    return adjust_prices(df, load_actions(data_folder, symbol), dividends)
+
+def main():
+    """Main function to parse arguments and record or show a symbol's actions."""
+    from L2_run_seasonal_analysis import data_folder as default_data_folder
+
+    parser = argparse.ArgumentParser(description="Record or show corporate actions for an L1 stock.")
+    parser.add_argument("--symbol", type=str, required=True, help="Stock symbol.")
+    parser.add_argument("--data-folder", type=str, default=default_data_folder, help="Folder with the L1 historical data.")
+    parser.add_argument("--split", nargs=2, metavar=("EX_DATE", "RATIO"), help="Record a split or bonus (ratio 2 = one share becomes two).")
+    parser.add_argument("--dividend", nargs=2, metavar=("EX_DATE", "AMOUNT"), help="Record a dividend per share.")
+    args = parser.parse_args()
+    symbol = args.symbol.upper()
+
+    new_actions = []
+    if args.split:
+        new_actions.append(split_action(pd.Timestamp(args.split[0]), float(args.split[1])))
+    if args.dividend:
+        l1_files = glob.glob(os.path.join(args.data_folder, f"{symbol} - *.csv"))
+        if not l1_files:
+            print(f"No L1 data file found for {symbol}")
+            return
+        df = pd.read_csv(l1_files[0], parse_dates=['DATE'])
+        ex_date = pd.Timestamp(args.dividend[0])
+        before = df[df['DATE'] < ex_date]
+        if before.empty:
+            print(f"No price before {ex_date.date()} to compute the dividend factor from")
+            return
+        new_actions.append(dividend_action(ex_date, float(args.dividend[1]), before['CLOSE'].iloc[-1]))
+
+    if new_actions:
+        changed = record_actions(args.data_folder, symbol, new_actions)
+        print(f"{symbol}: {'recorded' if changed else 'already recorded'}.")
+    print(load_actions(args.data_folder, symbol).to_string(index=False))
+
+if __name__ == "__main__":
+    main()
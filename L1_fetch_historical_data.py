@@ -5,6 +5,8 @@
 # Description:
 # This script downloads historical stock data from Yahoo Finance.
 # It is designed to be more robust than using the NSE's direct APIs.
+# Split, bonus and dividend events are recorded in the symbol's corporate-action
+# table (see L1_corporate_actions.py); the CSVs keep prices as traded.
 #
 # Usage:
 # 1. Run the script to download/update data for all available stocks:
@@ -13,6 +15,9 @@
 # 2. To download/update for a single stock:
 #    python fetch_stock_data_yfinance.py --symbol RELIANCE
 #
+# 3. To fill in the sector of every downloaded stock (used by the sector heatmaps):
+#    python fetch_stock_data_yfinance.py --update-sectors
+#
 
 import os
 import argparse
@@ -26,8 +31,14 @@ from tqdm import tqdm
 import time
 import random
 import glob
+from functools import partial
+
+import L1_corporate_actions as corporate_actions
+from L1_symbol_index import load_symbol_index
 
-OUTPUT_DIR = "L1_historical_stock_data"
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(PROJECT_DIR, "L1_historical_stock_data")
+SECTOR_FILE = os.path.join(PROJECT_DIR, "L1_stock_sectors.csv")
 
 def get_all_nse_symbols():
     """Fetches a list of all equity symbols from NSE."""
@@ -43,7 +54,7 @@ def get_all_nse_symbols():
         print(f"Error fetching stock list: {e}")
         return []
 
-def fetch_and_save_stock_data(symbol):
+def fetch_and_save_stock_data(symbol, output_dir=OUTPUT_DIR):
     """Downloads historical data and saves it to a 'SYMBOL - NAME.csv' file."""
     ticker = f"{symbol}.NS"
     file_path = None
@@ -51,7 +62,7 @@ def fetch_and_save_stock_data(symbol):
     
     try:
         # --- Determine file_path and start_date ---
-        existing_files = glob.glob(os.path.join(OUTPUT_DIR, f"{symbol} - *.csv"))
+        existing_files = glob.glob(os.path.join(output_dir, f"{symbol} - *.csv"))
         if existing_files:
             file_path = existing_files[0]
             try:
@@ -69,7 +80,7 @@ def fetch_and_save_stock_data(symbol):
             stock_info = yf.Ticker(ticker).info # Get stock info to determine company name for new file
             company_name = stock_info.get('longName', symbol)
             sanitized_name = "".join(c for c in company_name if c.isalnum() or c in (' ', '.')).rstrip()
-            file_path = os.path.join(OUTPUT_DIR, f"{symbol} - {sanitized_name}.csv")
+            file_path = os.path.join(output_dir, f"{symbol} - {sanitized_name}.csv")
 
         df_new = pd.DataFrame() # Initialize empty DataFrame
         
@@ -91,52 +102,111 @@ def fetch_and_save_stock_data(symbol):
         df_new.reset_index(inplace=True)
         df_new.rename(columns={'Date': 'DATE', 'Open': 'OPEN', 'High': 'HIGH', 'Low': 'LOW', 'Close': 'CLOSE', 'Volume': 'VOLUME'}, inplace=True)
         
-        df_new = df_new[['DATE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOLUME']]
         df_new['DATE'] = pd.to_datetime(df_new['DATE']).dt.date
+        for column in ('Dividends', 'Stock Splits'):
+            if column not in df_new.columns:
+                df_new[column] = 0.0
 
         # Append to existing file or write new file
         if existing_files and start_date: # Append if existing and new data was fetched
-            df_new.to_csv(file_path, mode='a', header=False, index=False)
+            # Keep the appended rows as traded and record the new splits/dividends instead
+            df_new = corporate_actions.unadjust_fetched_history(df_new)
+            actions = corporate_actions.extract_actions(df_new, previous_close=df_existing['CLOSE'].iloc[-1])
+            df_new[['DATE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOLUME']].to_csv(file_path, mode='a', header=False, index=False)
+            if actions:
+                corporate_actions.record_actions(output_dir, symbol, actions)
             return f"{symbol}: Success. Appended new data to {file_path}"
         else: # Write new file (either truly new or overwriting empty/corrupt existing)
-            df_new.to_csv(file_path, index=False)
+            # A full download is already split-adjusted by Yahoo, so only dividends are recorded
+            actions = corporate_actions.extract_actions(df_new, include_splits=False)
+            df_new[['DATE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOLUME']].to_csv(file_path, index=False)
+            corporate_actions.record_actions(output_dir, symbol, actions, replace=True)
             return f"{symbol}: Success. Saved to {file_path}"
 
     except Exception as e:
         return f"{symbol}: Error - {e}"
 
+def fetch_stock_sector(symbol):
+    """Looks up the sector and industry of a stock on Yahoo Finance."""
+    try:
+        time.sleep(random.uniform(1, 3)) # Apply sleep only when making a network call
+        stock_info = yf.Ticker(f"{symbol}.NS").info
+        return {'Stock Symbol': symbol, 'Sector': stock_info.get('sector'), 'Industry': stock_info.get('industry')}
+    except Exception:
+        return {'Stock Symbol': symbol, 'Sector': None, 'Industry': None}
+
+def update_sector_map(output_dir=OUTPUT_DIR):
+    """Adds the sector of every downloaded stock that is not yet in SECTOR_FILE."""
+    symbols = sorted({f.split(' - ')[0] for f in os.listdir(output_dir) if f.endswith(".csv")})
+
+    if os.path.exists(SECTOR_FILE):
+        sectors_df = pd.read_csv(SECTOR_FILE)
+        known = set(sectors_df.dropna(subset=['Sector'])['Stock Symbol'])
+    else:
+        sectors_df = pd.DataFrame(columns=['Stock Symbol', 'Sector', 'Industry'])
+        known = set()
+
+    missing = [s for s in symbols if s not in known]
+    if not missing:
+        print("Sector map is up to date.")
+        return
+
+    print(f"\nLooking up sectors for {len(missing)} stocks...")
+    with Pool(processes=4) as pool:
+        looked_up = list(tqdm(pool.imap_unordered(fetch_stock_sector, missing), total=len(missing)))
+
+    new_df = pd.DataFrame(looked_up)
+    sectors_df = pd.concat([sectors_df[~sectors_df['Stock Symbol'].isin(missing)], new_df], ignore_index=True)
+    sectors_df.sort_values(by='Stock Symbol').to_csv(SECTOR_FILE, index=False)
+    print(f"Saved sectors for {new_df['Sector'].notna().sum()}/{len(missing)} stocks to {SECTOR_FILE}")
+
+def fetch_all_stocks(output_dir=OUTPUT_DIR):
+    """Downloads/updates every NSE stock into output_dir. Returns the per-stock result messages."""
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+
+    symbols = get_all_nse_symbols()
+    if not symbols:
+        print("Could not retrieve stock list. Exiting.")
+        return []
+
+    print(f"\nStarting download for {len(symbols)} stocks using yfinance...")
+    # Use multiprocessing pool for parallel execution
+    with Pool(processes=4) as pool:
+        fetch = partial(fetch_and_save_stock_data, output_dir=output_dir)
+        results = list(tqdm(pool.imap_unordered(fetch, symbols), total=len(symbols)))
+
+    print("\n--- Download Complete ---")
+    # Optional: Print error messages for inspection
+    error_count = 0
+    for res in results:
+        if "Error" in res or "No data" in res:
+            print(res)
+            error_count += 1
+    print(f"\nFinished with {error_count} errors.")
+
+    # New listings become searchable in the app right away
+    load_symbol_index(output_dir)
+    return results
+
 def main():
     """Main function to parse arguments and orchestrate the download."""
     parser = argparse.ArgumentParser(description="Download historical stock data from Yahoo Finance.")
     parser.add_argument("--symbol", type=str, help="Download history for a single stock symbol.")
+    parser.add_argument("--update-sectors", action="store_true", help="Look up sectors for downloaded stocks missing from the sector map.")
     args = parser.parse_args()
 
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
 
-    if args.symbol:
+    if args.update_sectors:
+        update_sector_map()
+    elif args.symbol:
         # Single stock download
         print(fetch_and_save_stock_data(args.symbol.upper()))
     else:
         # All stocks download/update
-        symbols = get_all_nse_symbols()
-        if not symbols:
-            print("Could not retrieve stock list. Exiting.")
-            return
-
-        print(f"\nStarting download for {len(symbols)} stocks using yfinance...")
-        # Use multiprocessing pool for parallel execution
-        with Pool(processes=4) as pool:
-            results = list(tqdm(pool.imap_unordered(fetch_and_save_stock_data, symbols), total=len(symbols)))
-
-        print("\n--- Download Complete ---")
-        # Optional: Print error messages for inspection
-        error_count = 0
-        for res in results:
-            if "Error" in res or "No data" in res:
-                print(res)
-                error_count += 1
-        print(f"\nFinished with {error_count} errors.")
+        fetch_all_stocks()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,56 @@
+# L1_file_tracking.py
+#
+# Description:
+# Helpers to tell how an L1 data file changed since it was last processed.
+# L1 either appends new rows to a file, writes a new file for a new listing,
+# or rewrites a file from scratch; downstream caches use this to decide
+# between skipping, an incremental update and a full recompute.
+#
+
+import os
+import zlib
+
+NEW = "new"
+UNCHANGED = "unchanged"
+APPENDED = "appended"
+REWRITTEN = "rewritten"
+
+def file_fingerprint(path, content=None):
+    """
+    Returns a JSON-serializable fingerprint (size, mtime and CRC32 of the content) of a file.
+    """
+    if content is None:
+        with open(path, 'rb') as f:
+            content = f.read()
+    stat = os.stat(path)
+    return {
+        'size': len(content),
+        'mtime_ns': stat.st_mtime_ns,
+        'crc32': zlib.crc32(content),
+    }
+
+def classify_file_change(path, previous):
+    """
+    Compares a file against its previous fingerprint.
+
+    Returns (change, fingerprint, content) where change is one of NEW, UNCHANGED,
+    APPENDED or REWRITTEN. The file is only read when size or mtime differ;
+    content is None in that case. For APPENDED files the first previous['size']
+    bytes are identical to what was fingerprinted before.
+    """
+    stat = os.stat(path)
+    if previous and stat.st_size == previous['size'] and stat.st_mtime_ns == previous['mtime_ns']:
+        return UNCHANGED, previous, None
+
+    with open(path, 'rb') as f:
+        content = f.read()
+    fingerprint = file_fingerprint(path, content)
+
+    if not previous:
+        return NEW, fingerprint, content
+    if fingerprint['size'] >= previous['size'] and zlib.crc32(content[:previous['size']]) == previous['crc32']:
+        if fingerprint['size'] == previous['size']:
+            # Touched but not modified
+            return UNCHANGED, fingerprint, content
+        return APPENDED, fingerprint, content
+    return REWRITTEN, fingerprint, content
@@ -0,0 +1,259 @@
+# L1_symbol_index.py
+#
+# Description:
+# Search index over the symbols and company names of the L1 files, used by the
+# app's sidebar search. Lookups do not scan the universe:
+#
+# - prefix matches come from a sorted term list (bisect),
+# - typos and substrings are found through a trigram index, and only the best
+#   trigram candidates (plus, for short words, terms with the same first letter)
+#   are scored with difflib,
+#
+# and results are ranked by match quality (exact symbol, symbol prefix, name
+# word, substring, fuzzy). The index is saved next to the L1 files and only
+# rebuilt when the set of L1 files changes.
+#
+# Usage:
+# 1. Search from the command line (builds or refreshes the index if needed):
+#    python L1_symbol_index.py "tata cons"
+#
+# 2. Force a rebuild:
+#    python L1_symbol_index.py --rebuild
+#
+
+import os
+import re
+import json
+import zlib
+import bisect
+import heapq
+import difflib
+import argparse
+from collections import Counter
+
+INDEX_FILE_NAME = "symbol_index.json"
+INDEX_VERSION = 1
+
+SYMBOL = 0
+NAME = 1
+
+# How many trigram candidates are scored with difflib per query word
+FUZZY_CANDIDATES = 50
+MIN_FUZZY_RATIO = 0.7
+# Words shorter than this share few trigrams with their typos ("bnk" and "bank"
+# share none), so terms with the same first letter and a similar length are scored too
+SHORT_WORD = 5
+
+# Words that do not tell companies apart; a query does not have to match them
+COMPANY_SUFFIXES = {'ltd', 'limited', 'inc', 'incorporated', 'corp', 'corporation', 'co', 'company',
+                    'pvt', 'private', 'plc', 'llc'}
+# Added per optional query word (single letters, suffixes) that prefixes a symbol or name word
+OPTIONAL_WORD_BONUS = 5
+
+def _words(text):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+def _trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+def _listing_signature(stock_files):
+    return zlib.crc32("\n".join(sorted(stock_files)).encode())
+
+class SymbolIndex:
+    """
+    entries: [symbol, name, file] per L1 file.
+    terms: sorted search terms; postings[i] lists (entry, kind, word position) for terms[i].
+    trigrams: trigram -> indexes of the terms containing it.
+    """
+
+    def __init__(self, entries, terms, postings, trigrams, listing_signature=None):
+        self.entries = entries
+        self.terms = terms
+        self.postings = postings
+        self.trigrams = trigrams
+        self.listing_signature = listing_signature
+
+    @classmethod
+    def build(cls, stock_files):
+        entries = []
+        term_postings = {}
+        for stock_file in sorted(stock_files):
+            parts = stock_file.replace('.csv', '').split(' - ', 1)
+            symbol = parts[0]
+            name = parts[1] if len(parts) > 1 else symbol
+            entry = len(entries)
+            entries.append([symbol, name, stock_file])
+
+            symbol_terms = {symbol.lower(), "".join(_words(symbol))}
+            for term in symbol_terms - {""}:
+                term_postings.setdefault(term, []).append([entry, SYMBOL, 0])
+            for position, word in enumerate(_words(name)):
+                term_postings.setdefault(word, []).append([entry, NAME, position])
+
+        terms = sorted(term_postings)
+        trigrams = {}
+        for i, term in enumerate(terms):
+            for gram in _trigrams(term):
+                trigrams.setdefault(gram, []).append(i)
+        return cls(entries, terms, [term_postings[t] for t in terms], trigrams, _listing_signature(stock_files))
+
+    # --- Persistence ---
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        if data.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported symbol index version {data.get('version')}")
+        return cls(data['entries'], data['terms'], data['postings'], data['trigrams'], data['listing_signature'])
+
+    def save(self, path):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': INDEX_VERSION,
+                'listing_signature': self.listing_signature,
+                'entries': self.entries,
+                'terms': self.terms,
+                'postings': self.postings,
+                'trigrams': self.trigrams,
+            }, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    # --- Search ---
+
+    def _prefix_scores(self, word, scores):
+        start = bisect.bisect_left(self.terms, word)
+        for i in range(start, len(self.terms)):
+            term = self.terms[i]
+            if not term.startswith(word):
+                break
+            exact = term == word
+            for entry, kind, position in self.postings[i]:
+                if kind == SYMBOL:
+                    score = 100 if exact else 90 - min(len(term) - len(word), 10)
+                else:
+                    score = (75 if exact else 65) + (5 if position == 0 else 0)
+                if score > scores.get(entry, 0):
+                    scores[entry] = score
+
+    def _same_initial_candidates(self, word):
+        """Indexes of the terms starting with word's first letter whose length is within 2 of word's."""
+        start = bisect.bisect_left(self.terms, word[0])
+        end = bisect.bisect_left(self.terms, chr(ord(word[0]) + 1), start)
+        return [i for i in range(start, end) if abs(len(self.terms[i]) - len(word)) <= 2]
+
+    def _fuzzy_scores(self, word, scores):
+        grams = _trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.trigrams.get(gram, ()))
+        # Most shared trigrams first, then terms closest in length to the word
+        candidates = [i for i, _ in heapq.nsmallest(FUZZY_CANDIDATES, shared.items(),
+                                                    key=lambda item: (-item[1], abs(len(self.terms[item[0]]) - len(word))))]
+        if len(word) < SHORT_WORD:
+            candidates = set(candidates).union(self._same_initial_candidates(word))
+
+        matcher = difflib.SequenceMatcher(None, b=word)
+        for i in candidates:
+            term = self.terms[i]
+            if term.startswith(word):
+                continue  # already scored as a prefix match
+            if word in term:
+                ratio = 1.0
+            else:
+                matcher.set_seq1(term)
+                if matcher.real_quick_ratio() < MIN_FUZZY_RATIO or matcher.quick_ratio() < MIN_FUZZY_RATIO:
+                    continue
+                ratio = matcher.ratio()
+                if ratio < MIN_FUZZY_RATIO:
+                    continue
+            for entry, kind, _ in self.postings[i]:
+                score = (60 if kind == SYMBOL else 50) * ratio
+                if score > scores.get(entry, 0):
+                    scores[entry] = score
+
+    def search(self, query, limit=15):
+        """
+        Ranked matches for query as dicts (symbol, name, file, score). Every word of
+        the query has to match the symbol or a word of the company name, by prefix,
+        substring or (for words of 3+ characters) approximately. Single letters and
+        company suffixes (ltd, inc, ...) are optional and only lift the matches they prefix.
+        """
+        words = _words(query)
+        if not words:
+            return []
+        # A query like "m&m" or "bajaj-auto" is also tried as one symbol
+        squashed = "".join(words)
+
+        required = [w for w in words if len(w) > 1 and w not in COMPANY_SUFFIXES]
+        if not required and len(words) == 1:
+            required = words
+        optional = [w for w in words if w not in required]
+
+        totals = None
+        for word in required:
+            scores = {}
+            self._prefix_scores(word, scores)
+            if len(word) >= 3:
+                self._fuzzy_scores(word, scores)
+            totals = scores if totals is None else {e: totals[e] + s for e, s in scores.items() if e in totals}
+        totals = {e: s / len(required) for e, s in (totals or {}).items()}
+
+        for word in optional:
+            scores = {}
+            self._prefix_scores(word, scores)
+            for entry in scores.keys() & totals.keys():
+                totals[entry] += OPTIONAL_WORD_BONUS
+
+        if len(words) > 1:
+            symbol_scores = {}
+            self._prefix_scores(squashed, symbol_scores)
+            for entry, score in symbol_scores.items():
+                totals[entry] = max(totals.get(entry, 0), score)
+
+        ranked = sorted(totals.items(), key=lambda item: (-item[1], len(self.entries[item[0]][0]), self.entries[item[0]][0]))
+        return [
+            {'symbol': self.entries[e][0], 'name': self.entries[e][1], 'file': self.entries[e][2], 'score': round(score, 1)}
+            for e, score in ranked[:limit]
+        ]
+
+def load_symbol_index(data_folder, index_path=None, rebuild=False):
+    """
+    Loads the symbol index of data_folder, rebuilding and saving it only if the
+    set of L1 files changed since it was built (or rebuild is set).
+    """
+    index_path = index_path or os.path.join(data_folder, INDEX_FILE_NAME)
+    stock_files = [f for f in os.listdir(data_folder) if f.endswith(".csv")]
+
+    if not rebuild and os.path.exists(index_path):
+        try:
+            index = SymbolIndex.load(index_path)
+            if index.listing_signature == _listing_signature(stock_files):
+                return index
+        except (ValueError, KeyError, json.JSONDecodeError, OSError):
+            pass
+
+    index = SymbolIndex.build(stock_files)
+    index.save(index_path)
+    return index
+
+def main():
+    """Main function to parse arguments and search the index."""
+    from L2_run_seasonal_analysis import data_folder as default_data_folder
+
+    parser = argparse.ArgumentParser(description="Search L1 stocks by symbol or company name.")
+    parser.add_argument("query", nargs="?", help="Symbol or company name, typos allowed.")
+    parser.add_argument("--data-folder", type=str, default=default_data_folder, help="Folder with the L1 historical data.")
+    parser.add_argument("--limit", type=int, default=15, help="Number of results.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the index even if the L1 files did not change.")
+    args = parser.parse_args()
+
+    index = load_symbol_index(args.data_folder, rebuild=args.rebuild)
+    print(f"Index covers {len(index.entries)} stocks ({len(index.terms)} terms).")
+    if args.query:
+        for match in index.search(args.query, args.limit):
+            print(f"{match['score']:6.1f}  {match['symbol']:<15} {match['name']}")
+
+if __name__ == "__main__":
+    main()
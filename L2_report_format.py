@@ -0,0 +1,169 @@
+# L2_report_format.py
+#
+# Description:
+# Reading and writing of L2 seasonal analysis reports. A report is either
+#
+# - full: one CSV row per (start_day, window_size) slot, about 133k rows, with
+#   'Stock Symbol' and 'Stock Name' on every row (the original format), or
+#
+# - compact: '# key: value' metadata lines (symbol, name, slot counts) followed
+#   by a CSV that keeps, at full precision, only the slots on the Pareto frontier
+#   of (median_return, consistency, min_return, -Standard_Dev, total_years)
+#   within each window band, plus one coarse summary row per
+#   (window band, start week) cell. A slot_kind column tells the two apart.
+#
+# Every slot L3 could pick is on a frontier: for a positive median return (L3
+# requires min_return >= 15%) its score never decreases when any of these
+# objectives improves, and the window bands keep L3's 3-15 day range a union
+# of whole bands. L3 therefore selects the same slot from either format.
+#
+# Readers should go through load_slot_report, which accepts both formats.
+#
+
+import numpy as np
+import pandas as pd
+
+FULL = "full"
+COMPACT = "compact"
+PARETO = "pareto"
+GRID = "grid"
+
+# Window bands [edge, next edge) used for the Pareto frontiers and the coarse grid
+WINDOW_BANDS = (1, 3, 8, 16, 31, 61, 91, 181, 366)
+GRID_START_BIN_DAYS = 7
+
+SLOT_COLUMNS = ['start_day', 'end_day', 'median_return', 'min_return', 'max_return', 'Standard_Dev',
+                'consistency', 'positive_years', 'total_years', 'window_size']
+# How each coarse grid cell summarizes its slots
+GRID_AGGREGATIONS = {
+    'median_return': 'mean',
+    'min_return': 'min',
+    'max_return': 'max',
+    'Standard_Dev': 'mean',
+    'consistency': 'mean',
+    'positive_years': 'mean',
+    'total_years': 'mean',
+}
+
+def _weakly_dominated(A, B):
+    """(len(B), len(A)) matrix: True where row A[j] is >= B[i] in every objective."""
+    dominated = np.ones((len(B), len(A)), dtype=bool)
+    for j in range(A.shape[1]):
+        dominated &= A[None, :, j] >= B[:, None, j]
+    return dominated
+
+def pareto_mask(objectives, chunk_size=2048):
+    """
+    Boolean mask of the rows of `objectives` (rows x objectives, all maximized)
+    that no other row dominates. Identical rows are kept together.
+    """
+    unique, inverse = np.unique(objectives, axis=0, return_inverse=True)
+    # Descending lexicographic order: a row can only be dominated by rows before it
+    order = np.lexsort(-unique.T[::-1])
+    ordered = unique[order]
+    keep = np.zeros(len(unique), dtype=bool)
+    frontier = ordered[:0]
+
+    for start in range(0, len(ordered), chunk_size):
+        chunk, idx = ordered[start:start + chunk_size], order[start:start + chunk_size]
+        # Rows are distinct, so weak dominance by another row is strict dominance
+        survivors = ~_weakly_dominated(frontier, chunk).any(axis=1)
+        chunk, idx = chunk[survivors], idx[survivors]
+        within = _weakly_dominated(chunk, chunk)
+        np.fill_diagonal(within, False)
+        survivors = ~within.any(axis=1)
+        keep[idx[survivors]] = True
+        frontier = np.vstack([frontier, chunk[survivors]])
+
+    return keep[inverse.ravel()]
+
+def _pareto_objectives(df):
+    # Same floor for a zero standard deviation as L3's quality score
+    safe_std = np.where(df['Standard_Dev'] > 0, df['Standard_Dev'], 0.0001)
+    return np.column_stack([
+        df['median_return'].to_numpy(dtype=float),
+        df['consistency'].to_numpy(dtype=float),
+        df['min_return'].to_numpy(dtype=float),
+        -safe_std,
+        df['total_years'].to_numpy(dtype=float),
+    ])
+
+def window_band(window_size):
+    """Index of the window band each window size falls into."""
+    return np.searchsorted(WINDOW_BANDS, window_size, side='right') - 1
+
+def compact_report(results_df):
+    """
+    Splits a full report into its Pareto slots (one frontier per window band,
+    original row order) and the coarse (window band, start week) summary grid.
+    """
+    bands = window_band(results_df['window_size'].to_numpy())
+    keep = np.zeros(len(results_df), dtype=bool)
+    for band in np.unique(bands):
+        in_band = np.flatnonzero(bands == band)
+        keep[in_band] = pareto_mask(_pareto_objectives(results_df.iloc[in_band]))
+    pareto = results_df.loc[keep, SLOT_COLUMNS]
+
+    start_bins = (results_df['start_day'].to_numpy() - 1) // GRID_START_BIN_DAYS
+    cells = results_df[list(GRID_AGGREGATIONS)].groupby([bands, start_bins])
+    grid = cells.agg(GRID_AGGREGATIONS).round(6)
+    grid['n_slots'] = cells.size()
+    grid = grid.reset_index(names=['band', 'start_bin'])
+    grid['window_size'] = np.asarray(WINDOW_BANDS)[grid['band']]
+    grid['start_day'] = grid['start_bin'] * GRID_START_BIN_DAYS + 1
+    grid['end_day'] = (grid['start_day'] + grid['window_size']) % 365
+    return pareto, grid[SLOT_COLUMNS + ['n_slots']]
+
+def write_compact_report(results_df, path):
+    """Writes results_df (a full report with symbol and name columns) as a compact report."""
+    pareto, grid = compact_report(results_df)
+    symbol = results_df['Stock Symbol'].iloc[0]
+    metadata = {
+        'report_format': COMPACT,
+        'Stock Symbol': symbol,
+        'Stock Name': results_df['Stock Name'].iloc[0] if 'Stock Name' in results_df.columns else symbol,
+        'total_slots': len(results_df),
+        'pareto_slots': len(pareto),
+        'window_bands': ",".join(str(edge) for edge in WINDOW_BANDS),
+        'grid_start_bin_days': GRID_START_BIN_DAYS,
+    }
+    data = pd.concat([pareto.assign(slot_kind=PARETO), grid.assign(slot_kind=GRID)], ignore_index=True)
+    with open(path, 'w', newline='') as f:
+        for key, value in metadata.items():
+            f.write(f"# {key}: {value}\n")
+        data.to_csv(f, index=False)
+
+def read_report_header(path):
+    """Returns the '# key: value' metadata of a compact report ({} for a full report)."""
+    metadata = {}
+    with open(path) as f:
+        for line in f:
+            if not line.startswith('# '):
+                break
+            key, _, value = line[2:].rstrip('\n').partition(': ')
+            metadata[key] = value
+    return metadata
+
+def load_slot_report(path, include_grid=False):
+    """
+    Loads an L2 report of either format as a DataFrame of slots with 'Stock Symbol'
+    and 'Stock Name' columns. For compact reports only the Pareto slots are returned,
+    unless include_grid is set (then slot_kind and n_slots tell the rows apart).
+    df.attrs holds 'report_format' and, for compact reports, the header metadata.
+    """
+    metadata = read_report_header(path)
+    if metadata.get('report_format') != COMPACT:
+        df = pd.read_csv(path)
+        df.attrs['report_format'] = FULL
+        return df
+
+    # Pareto rows come first, so the grid does not even have to be parsed
+    nrows = None if include_grid else int(metadata['pareto_slots'])
+    df = pd.read_csv(path, skiprows=len(metadata), nrows=nrows)
+    if not include_grid:
+        df = df.drop(columns=['slot_kind', 'n_slots'], errors='ignore')
+        df[['positive_years', 'total_years']] = df[['positive_years', 'total_years']].astype('int64')
+    df['Stock Symbol'] = metadata['Stock Symbol']
+    df['Stock Name'] = metadata['Stock Name']
+    df.attrs.update(metadata)
+    return df
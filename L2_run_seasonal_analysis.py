@@ -1,10 +1,13 @@
 import pandas as pd
-from tqdm import tqdm
 import numpy as np
-import concurrent.futures
 import os
+import socket
+import argparse
 from datetime import datetime
 
+import L1_corporate_actions as corporate_actions
+from L2_report_format import write_compact_report
+
 def calculate_daily_returns(df):
     """
     Calculates the daily returns of a stock.
@@ -69,27 +72,85 @@ def analyze_slot(args):
         }
     return None
 
+def compute_yearly_slot_returns(df, window_sizes=range(1, 366), start_days=range(1, 366)):
+    """
+    Vectorized version of the per-year returns gathered by analyze_slot.
+    Returns (years, returns) where returns has shape (years, window_sizes, start_days)
+    and holds NaN for years in which the slot has no trading data.
+    """
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    dates = df.index.values.astype('datetime64[D]')
+    close = df['CLOSE'].to_numpy(dtype=float)
+    years = df.index.year.unique().to_numpy()
+    windows = np.asarray(window_sizes, dtype='int64')
+    starts = np.asarray(start_days, dtype='int64')
+
+    returns = np.full((len(years), len(windows), len(starts)), np.nan)
+    for i, year in enumerate(years):
+        start_dates = np.datetime64(f"{year}-01-01") + (starts - 1).astype('timedelta64[D]')
+        end_dates = start_dates[None, :] + windows[:, None].astype('timedelta64[D]')
+
+        # First and last trading rows inside [start_date, end_date], as df.loc would slice them
+        first_idx = np.searchsorted(dates, start_dates, side='left')
+        last_idx = np.searchsorted(dates, end_dates, side='right') - 1
+        first_idx = np.broadcast_to(first_idx, last_idx.shape)
+        has_data = (first_idx <= last_idx) & (first_idx < len(dates))
+
+        first_close = close[np.minimum(first_idx, len(close) - 1)]
+        last_close = close[np.maximum(last_idx, 0)]
+        returns[i] = np.where(has_data, (last_close - first_close) / first_close, np.nan)
+    return years, returns
+
+def summarize_yearly_slot_returns(returns, window_sizes=range(1, 366), start_days=range(1, 366)):
+    """
+    Turns the (years, window_sizes, start_days) output of compute_yearly_slot_returns
+    into the per-slot statistics analyze_slot reports, as a DataFrame in
+    (window_size, start_day) order. Slots without any yearly return are dropped.
+    """
+    windows = np.asarray(window_sizes)
+    starts = np.asarray(start_days)
+    valid = ~np.isnan(returns)
+    total_years = valid.sum(axis=0)
+    positive_years = (returns > 0).sum(axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Sorting pushes NaN to the end, so the median is read off the valid counts
+        ordered = np.sort(returns, axis=0)
+        last = np.maximum(total_years - 1, 0)
+        lower = np.take_along_axis(ordered, (last // 2)[None], axis=0)[0]
+        upper = np.take_along_axis(ordered, ((last + 1) // 2)[None], axis=0)[0]
+        median_return = (lower + upper) / 2
+        min_return = np.take_along_axis(ordered, np.zeros_like(last)[None], axis=0)[0]
+        max_return = np.take_along_axis(ordered, last[None], axis=0)[0]
+        mean_return = np.where(valid, returns, 0).sum(axis=0) / total_years
+        Standard_Dev = np.sqrt(np.where(valid, (returns - mean_return) ** 2, 0).sum(axis=0) / total_years)
+        consistency = positive_years / total_years
+
+    window_grid, start_grid = np.meshgrid(windows, starts, indexing='ij')
+    results_df = pd.DataFrame({
+        "start_day": start_grid.ravel(),
+        "end_day": ((start_grid + window_grid) % 365).ravel(),
+        "median_return": median_return.ravel(),
+        "min_return": min_return.ravel(),
+        "max_return": max_return.ravel(),
+        "Standard_Dev": Standard_Dev.ravel(),
+        "consistency": consistency.ravel(),
+        "positive_years": positive_years.ravel(),
+        "total_years": total_years.ravel(),
+        "window_size": window_grid.ravel(),
+    })
+    return results_df[results_df['total_years'] > 0].reset_index(drop=True)
+
 def find_all_seasonal_slots(df, progress_callback, log_callback=None):
     """
     Finds all seasonal slots for all window sizes and returns all results.
-    This function is parallelized to speed up the analysis of a single stock.
+    Every slot's yearly returns come from one vectorized pass
+    (compute_yearly_slot_returns), giving the same statistics as analyze_slot.
     """
-    all_results = []
-    
-    tasks = []
-    for window_size in range(1, 366):
-        for start_day in range(1, 366):
-            tasks.append((df, window_size, start_day))
-
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        # Using tqdm to show progress for the inner loop, though this will only be visible
-        # if this function is run in a context that displays tqdm's output.
-        results = list(tqdm(executor.map(analyze_slot, tasks), total=len(tasks), desc="Analyzing slots"))
-        all_results = [res for res in results if res is not None]
-
-    # The progress_callback is not easily supported with this parallel structure,
-    # as the tasks are not completed in a predictable order for window_size.
-    # If progress reporting is critical, a different approach would be needed.
+    _, returns = compute_yearly_slot_returns(df)
+    all_results = summarize_yearly_slot_returns(returns).to_dict('records')
+
     if progress_callback:
         progress_callback(1.0) # Mark as complete
 
@@ -140,18 +201,43 @@ def find_volume_spikes(df, lookback=50, threshold=2.0):
 
 # --- Batch Analysis Logic --- 
 
-# --- Folder Paths (consider making these configurable) ---
-data_folder = "/Users/gautamchaskar/Documents/NSE-Stock-Data/L1_historical_stock_data"
-results_folder = "/Users/gautamchaskar/Documents/NSE-Stock-Data/L2_seasonal_analysis_reports"
+# --- Folder Paths (relative to the project folder; pass other folders to the functions below) ---
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+data_folder = os.path.join(PROJECT_DIR, "L1_historical_stock_data")
+results_folder = os.path.join(PROJECT_DIR, "L2_seasonal_analysis_reports")
+
+def load_stock_data(stock_file, data_folder=data_folder):
+    """
+    Loads an L1 file indexed by DATE, with prices adjusted for the stock's recorded
+    splits and bonuses (see L1_corporate_actions.py).
+    """
+    df = corporate_actions.load_adjusted_prices(stock_file, data_folder)
+    df.set_index('DATE', inplace=True)
+    return df
+
+def save_report(results_df, report_path, compact=False):
+    """
+    Writes an L2 report atomically: readers never see a half-written file, and
+    several workers writing the same report just replace it with the same content.
+    compact=True writes the Pareto-pruned format (see L2_report_format.py).
+    """
+    tmp_path = f"{report_path}.{socket.gethostname()}.{os.getpid()}.tmp"
+    try:
+        if compact:
+            write_compact_report(results_df, tmp_path)
+        else:
+            results_df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, report_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
-def _run_and_save_single_stock_analysis(stock_file):
+def _run_and_save_single_stock_analysis(stock_file, data_folder=data_folder, results_folder=results_folder, compact=False):
     """
     Internal function to run seasonal analysis for a single stock file and save the results.
     """
     try:
-        df = pd.read_csv(os.path.join(data_folder, stock_file))
-        df['DATE'] = pd.to_datetime(df['DATE'])
-        df.set_index('DATE', inplace=True)
+        df = load_stock_data(stock_file, data_folder)
         
         # Call the function to get ALL slots
         all_slots = find_all_seasonal_slots(df, progress_callback=None, log_callback=None)
@@ -169,16 +255,17 @@ def _run_and_save_single_stock_analysis(stock_file):
             results_df['Stock Name'] = stock_name_full
             
             # Save the entire DataFrame
-            results_df.to_csv(os.path.join(results_folder, f"{stock_symbol}.csv"), index=False)
+            save_report(results_df, os.path.join(results_folder, f"{stock_symbol}.csv"), compact)
             return f"Successfully processed {stock_file}"
         else:
             return f"No seasonal slots found for {stock_file}"
     except Exception as e:
         return f"Error processing {stock_file}: {e}"
 
-def run_full_batch_analysis():
+def run_full_batch_analysis(data_folder=data_folder, results_folder=results_folder, compact=False):
     """
     Runs the full batch seasonal analysis for all stocks found in the data_folder.
+    compact=True writes Pareto-pruned compact reports instead of every slot.
     """
     print(f"[{datetime.now()}] Starting full batch analysis...")
 
@@ -190,13 +277,16 @@ def run_full_batch_analysis():
     total_stocks = len(stock_files)
     print(f"[{datetime.now()}] Found {total_stocks} stock files.")
     
-    # Process stocks sequentially. The parallelism is handled inside find_all_seasonal_slots.
+    # Process stocks sequentially. Each stock is analyzed in one vectorized pass.
     for i, stock_file in enumerate(stock_files):
         print(f"\n--- Processing stock {i + 1}/{total_stocks}: {stock_file} ---")
-        result = _run_and_save_single_stock_analysis(stock_file)
+        result = _run_and_save_single_stock_analysis(stock_file, data_folder, results_folder, compact)
         print(f"--- Finished stock {i + 1}/{total_stocks}: {result} ---")
 
     print(f"\n[{datetime.now()}] Batch analysis complete!")
 
 if __name__ == '__main__':
-    run_full_batch_analysis()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the L2 seasonal analysis for every L1 stock.")
+    parser.add_argument("--compact", action="store_true", help="Write Pareto-pruned compact reports (about 100x smaller).")
+    args = parser.parse_args()
+    run_full_batch_analysis(compact=args.compact)
\ No newline at end of file
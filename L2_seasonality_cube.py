@@ -0,0 +1,294 @@
+# L2_seasonality_cube.py
+#
+# Description:
+# Precomputed symbol x year x month return cube for the whole L1 universe.
+# Each cell holds the sum and count of daily returns, so the mean daily return
+# per month (what get_seasonal_heatmap_data shows) is sums / counts, and new
+# rows appended by L1 can be folded in without re-reading full histories.
+# Returns use split-adjusted prices; a symbol whose corporate-action table
+# changed is rebuilt from its full history.
+#
+# The stock heatmap in the app, and the sector and universe heatmaps, read
+# from this cube instead of recomputing pct_change and a groupby every rerun.
+#
+# Usage:
+# 1. Update the cube with whatever changed in L1 since the last run:
+#    python L2_seasonality_cube.py
+#
+# 2. Rebuild it from scratch:
+#    python L2_seasonality_cube.py --rebuild
+#
+
+import io
+import os
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from tqdm import tqdm
+
+import L1_file_tracking as tracking
+import L1_corporate_actions as corporate_actions
+from L2_run_seasonal_analysis import data_folder, results_folder
+
+CUBE_FILE = os.path.join(results_folder, "seasonality_cube.npz")
+# Optional 'Stock Symbol,Sector' mapping written by `L1_fetch_historical_data.py --update-sectors`
+SECTOR_FILE = os.path.join(os.path.dirname(data_folder), "L1_stock_sectors.csv")
+
+MONTH_NAMES = [datetime(2023, m, 1).strftime('%b') for m in range(1, 13)]
+
+def _daily_returns(df, previous_close=np.nan):
+    """
+    Daily close-to-close returns with their years and months, as plain arrays.
+    previous_close is the close before df's first row (NaN for a full history).
+    """
+    dates = pd.to_datetime(df['DATE'])
+    close = df['CLOSE'].to_numpy(dtype=float)
+    prev = np.concatenate([[previous_close], close[:-1]])
+    returns = close / prev - 1
+    valid = np.isfinite(returns)
+    return dates.dt.year.to_numpy()[valid], dates.dt.month.to_numpy()[valid], returns[valid]
+
+class SeasonalityCube:
+    """
+    Sums and counts of daily returns indexed by (symbol, year, month).
+    """
+
+    def __init__(self, symbols=None, names=None, years=None, sums=None, counts=None, last_close=None, state=None):
+        self.symbols = list(symbols) if symbols is not None else []
+        self.names = list(names) if names is not None else []
+        self.years = np.asarray(years if years is not None else [], dtype='int64')
+        self.sums = sums if sums is not None else np.zeros((0, 0, 12))
+        self.counts = counts if counts is not None else np.zeros((0, 0, 12), dtype='int64')
+        self.last_close = np.asarray(last_close if last_close is not None else [], dtype=float)
+        # Per symbol: the L1 filename and its fingerprint when it was last folded in
+        self.state = state or {}
+        self._symbol_pos = {s: i for i, s in enumerate(self.symbols)}
+
+    # --- Persistence ---
+
+    @classmethod
+    def load(cls, path=CUBE_FILE):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                symbols=data['symbols'].tolist(),
+                names=data['names'].tolist(),
+                years=data['years'],
+                sums=data['sums'],
+                counts=data['counts'],
+                last_close=data['last_close'],
+                state=json.loads(str(data['state'])),
+            )
+
+    def save(self, path=CUBE_FILE):
+        folder = os.path.dirname(path)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        # Write to a temp file and swap it in so readers never see a partial cube
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                symbols=np.array(self.symbols, dtype=str),
+                names=np.array(self.names, dtype=str),
+                years=self.years,
+                sums=self.sums,
+                counts=self.counts,
+                last_close=self.last_close,
+                state=np.array(json.dumps(self.state)),
+            )
+        os.replace(tmp_path, path)
+
+    # --- Updates ---
+
+    def _ensure_symbol(self, symbol, name):
+        if symbol in self._symbol_pos:
+            i = self._symbol_pos[symbol]
+            self.names[i] = name
+            return i
+        self.symbols.append(symbol)
+        self.names.append(name)
+        self._symbol_pos[symbol] = len(self.symbols) - 1
+        self.sums = np.concatenate([self.sums, np.zeros((1, len(self.years), 12))])
+        self.counts = np.concatenate([self.counts, np.zeros((1, len(self.years), 12), dtype=self.counts.dtype)])
+        self.last_close = np.append(self.last_close, np.nan)
+        return len(self.symbols) - 1
+
+    def _ensure_years(self, years):
+        missing = np.setdiff1d(np.unique(years), self.years)
+        if not len(missing):
+            return
+        all_years = np.union1d(self.years, missing)
+        pos = np.searchsorted(all_years, self.years)
+        sums = np.zeros((len(self.symbols), len(all_years), 12))
+        counts = np.zeros((len(self.symbols), len(all_years), 12), dtype=self.counts.dtype)
+        sums[:, pos] = self.sums
+        counts[:, pos] = self.counts
+        self.years, self.sums, self.counts = all_years, sums, counts
+
+    def add_returns(self, symbol_idx, years, months, returns):
+        """
+        Folds daily returns into the cube. All arguments are aligned arrays, so
+        any number of symbols can be added in a single vectorized pass.
+        """
+        symbol_idx = np.asarray(symbol_idx)
+        self._ensure_years(years)
+        year_idx = np.searchsorted(self.years, years)
+        flat = np.ravel_multi_index((symbol_idx, year_idx, np.asarray(months) - 1), self.sums.shape)
+        size = self.sums.size
+        self.sums += np.bincount(flat, weights=returns, minlength=size).reshape(self.sums.shape)
+        self.counts += np.bincount(flat, minlength=size).reshape(self.counts.shape).astype(self.counts.dtype)
+
+    def reset_symbol(self, symbol):
+        i = self._symbol_pos[symbol]
+        self.sums[i] = 0
+        self.counts[i] = 0
+        self.last_close[i] = np.nan
+
+    def remove_symbols(self, symbols):
+        removed = set(symbols)
+        keep = [i for i, s in enumerate(self.symbols) if s not in removed]
+        self.symbols = [self.symbols[i] for i in keep]
+        self.names = [self.names[i] for i in keep]
+        self.sums, self.counts, self.last_close = self.sums[keep], self.counts[keep], self.last_close[keep]
+        for symbol in symbols:
+            self.state.pop(symbol, None)
+        self._symbol_pos = {s: i for i, s in enumerate(self.symbols)}
+
+    # --- Reads ---
+
+    def _to_heatmap(self, sums, counts):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+        heatmap = pd.DataFrame(means, index=pd.Index(self.years, name='YEAR'), columns=MONTH_NAMES)
+        # Same shape as get_seasonal_heatmap_data: only years/months with data
+        return heatmap.dropna(how='all').dropna(axis=1, how='all')
+
+    def symbol_heatmap(self, symbol):
+        """Mean daily return per (year, month) for one symbol, or None if it is not in the cube."""
+        if symbol not in self._symbol_pos:
+            return None
+        i = self._symbol_pos[symbol]
+        return self._to_heatmap(self.sums[i], self.counts[i])
+
+    def aggregate_heatmap(self, symbols=None):
+        """
+        Equal-weighted average over symbols of each symbol's mean daily return per
+        (year, month). symbols=None aggregates the whole universe.
+        """
+        idx = list(range(len(self.symbols))) if symbols is None else [self._symbol_pos[s] for s in symbols if s in self._symbol_pos]
+        if not idx:
+            return None
+        counts = self.counts[idx]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            per_symbol = np.where(counts > 0, self.sums[idx] / np.maximum(counts, 1), 0.0)
+        n_symbols = np.sum(counts > 0, axis=0)
+        return self._to_heatmap(per_symbol.sum(axis=0), n_symbols)
+
+def load_sector_map(path=SECTOR_FILE):
+    """Returns {sector: [symbols]} from the optional sector file, or {} if it does not exist."""
+    if not os.path.exists(path):
+        return {}
+    sectors = pd.read_csv(path).dropna(subset=['Sector'])
+    return {sector: sorted(group['Stock Symbol']) for sector, group in sectors.groupby('Sector')}
+
+def _split_filename(stock_file):
+    parts = stock_file.replace('.csv', '').split(' - ')
+    return parts[0], parts[1] if len(parts) > 1 else parts[0]
+
+def update_seasonality_cube(data_folder=data_folder, cube_path=CUBE_FILE, rebuild=False):
+    """
+    Brings the cube in line with the L1 folder: new and rewritten files are folded
+    in from their full history, appended files only from their new rows, and
+    removed files are dropped. Returns the updated cube.
+    """
+    if not rebuild and os.path.exists(cube_path):
+        cube = SeasonalityCube.load(cube_path)
+    else:
+        cube = SeasonalityCube()
+
+    stock_files = sorted([f for f in os.listdir(data_folder) if f.endswith(".csv")])
+
+    # Drop delisted/removed files first so symbol positions stay stable below
+    current_symbols = {_split_filename(f)[0] for f in stock_files}
+    removed = [s for s in cube.symbols if s not in current_symbols]
+    if removed:
+        cube.remove_symbols(removed)
+
+    batch_symbols, batch_years, batch_months, batch_returns = [], [], [], []
+    counts = {tracking.NEW: 0, tracking.APPENDED: 0, tracking.REWRITTEN: 0, tracking.UNCHANGED: 0}
+
+    for stock_file in tqdm(stock_files, desc="Scanning L1 files"):
+        symbol, name = _split_filename(stock_file)
+        previous = cube.state.get(symbol)
+        # A file renamed under the same symbol is treated as rewritten
+        previous_fingerprint = previous['fingerprint'] if previous and previous['file'] == stock_file else None
+
+        try:
+            stock_path = os.path.join(data_folder, stock_file)
+            change, fingerprint, content = tracking.classify_file_change(stock_path, previous_fingerprint)
+            actions_fingerprint = corporate_actions.actions_fingerprint(data_folder, symbol)
+            actions_changed = previous is not None and corporate_actions.actions_changed(previous.get('actions'), actions_fingerprint)
+            if change == tracking.UNCHANGED and not actions_changed:
+                cube.state[symbol] = {'file': stock_file, 'fingerprint': fingerprint, 'actions': actions_fingerprint}
+                counts[change] += 1
+                continue
+            if previous and (change == tracking.NEW or actions_changed):
+                # A new split re-scales the whole history, so the symbol is rebuilt
+                change = tracking.REWRITTEN
+                if content is None:
+                    with open(stock_path, 'rb') as f:
+                        content = f.read()
+
+            i = cube._ensure_symbol(symbol, name)
+            if change == tracking.APPENDED:
+                # Only parse the appended bytes, under the original header
+                header = content[:content.index(b'\n') + 1]
+                df = pd.read_csv(io.BytesIO(header + content[previous_fingerprint['size']:]))
+                previous_close = cube.last_close[i]
+            else:
+                cube.reset_symbol(symbol)
+                df = pd.read_csv(io.BytesIO(content))
+                previous_close = np.nan
+            df = corporate_actions.adjust_prices(df, corporate_actions.load_actions(data_folder, symbol))
+
+            if not df.empty:
+                years, months, returns = _daily_returns(df, previous_close)
+                batch_symbols.append(np.full(len(returns), i))
+                batch_years.append(years)
+                batch_months.append(months)
+                batch_returns.append(returns)
+                cube.last_close[i] = df['CLOSE'].iloc[-1]
+
+            cube.state[symbol] = {'file': stock_file, 'fingerprint': fingerprint, 'actions': actions_fingerprint}
+            counts[change] += 1
+        except Exception as e:
+            print(f"  -> Error processing {stock_file}: {e}")
+
+    if batch_returns:
+        # One vectorized pass over every new return in the universe
+        cube.add_returns(
+            np.concatenate(batch_symbols),
+            np.concatenate(batch_years),
+            np.concatenate(batch_months),
+            np.concatenate(batch_returns),
+        )
+
+    cube.save(cube_path)
+    print(f"Seasonality cube: {counts[tracking.NEW]} new, {counts[tracking.APPENDED]} appended, "
+          f"{counts[tracking.REWRITTEN]} rewritten, {counts[tracking.UNCHANGED]} unchanged, {len(removed)} removed.")
+    return cube
+
+def main():
+    """Main function to parse arguments and update the cube."""
+    parser = argparse.ArgumentParser(description="Build or incrementally update the symbol x year x month seasonality cube.")
+    parser.add_argument("--data-folder", type=str, default=data_folder, help="Folder with the L1 historical data.")
+    parser.add_argument("--cube-file", type=str, default=CUBE_FILE, help="Path of the cube file.")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the existing cube and rebuild from scratch.")
+    args = parser.parse_args()
+
+    update_seasonality_cube(args.data_folder, args.cube_file, args.rebuild)
+
+if __name__ == "__main__":
+    main()
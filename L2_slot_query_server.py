@@ -0,0 +1,547 @@
+# L2_slot_query_server.py
+#
+# Description:
+# A long-running local query service over the L2 seasonal slot reports.
+# All reports are loaded once into columnar NumPy arrays, split by symbol into
+# segments. Each segment has sorted indexes on window_size, start_day and
+# consistency, and filtered, sorted and paginated queries are answered from
+# memory by merging the segments' matches. The reports folder is polled and
+# changed reports are reloaded in the background (hot reload); a reload only
+# rebuilds the segments those reports belong to.
+#
+# Usage:
+# 1. Start the server:
+#    python L2_slot_query_server.py --port 8765
+#
+# 2. Query it over HTTP:
+#    curl "http://127.0.0.1:8765/query?window_min=5&window_max=10&consistency_min=0.8&start_month=3"
+#
+# 3. Or from Python (a notebook, app.py):
+#    from L2_slot_query_server import SlotQueryClient
+#    SlotQueryClient().query(window_min=5, window_max=10, consistency_min=0.8, start_month=3)
+#
+#    or, without a server, directly in-process:
+#    SlotStore(results_folder).query(window_min=5, window_max=10)
+#
+
+import os
+import json
+import zlib
+import time
+import argparse
+import threading
+import urllib.parse
+import urllib.request
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+from L2_run_seasonal_analysis import results_folder
+from L2_report_format import load_slot_report
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+RELOAD_INTERVAL = 10  # seconds between polls of the reports folder
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 5000
+
+# Compact dtypes keep the full universe (~133k slots per stock) in memory
+COLUMN_DTYPES = {
+    'window_size': 'int16',
+    'start_day': 'int16',
+    'end_day': 'int16',
+    'median_return': 'float32',
+    'min_return': 'float32',
+    'max_return': 'float32',
+    'Standard_Dev': 'float32',
+    'consistency': 'float32',
+    'positive_years': 'int16',
+    'total_years': 'int16',
+}
+INDEXED_COLUMNS = ('window_size', 'start_day', 'consistency')
+
+# Reports are spread over this many independently indexed segments (by symbol),
+# so a reload re-sorts only the segments of the reports that changed
+SEGMENT_COUNT = 32
+
+# First day-of-year of each month in a non-leap year, used for start_month filters
+MONTH_START_DAYS = np.cumsum([1, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+def _column_bound(column, value):
+    """
+    value in the precision the column is stored in, so float32(0.8) matches a bound
+    of 0.8 whether the column is searched through its index or masked.
+    """
+    if value is None or np.dtype(COLUMN_DTYPES[column]).kind != 'f':
+        return value
+    return np.dtype(COLUMN_DTYPES[column]).type(value)
+
+def _segment_of(stock_symbol):
+    return zlib.crc32(stock_symbol.encode()) % SEGMENT_COUNT
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+def load_report_columns(path):
+    """
+    Reads one L2 report (full or compact) into a dict of compact NumPy columns plus its symbol and name.
+    """
+    df = load_slot_report(path)
+    columns = {}
+    for column, dtype in COLUMN_DTYPES.items():
+        if column in df.columns:
+            columns[column] = df[column].to_numpy(dtype=dtype)
+        else:
+            # Old-format reports miss some columns
+            columns[column] = np.full(len(df), np.nan if dtype.startswith('float') else -1, dtype=dtype)
+
+    stock_symbol = os.path.basename(path).replace('.csv', '')
+    stock_name = df['Stock Name'].iloc[0] if 'Stock Name' in df.columns and len(df) else stock_symbol
+    return columns, stock_symbol, stock_name
+
+class _Segment:
+    """
+    Immutable columnar view over the reports of one segment plus its sorted indexes.
+    Rows are grouped by symbol, in symbol order.
+    """
+
+    def __init__(self, blocks):
+        self.symbols = sorted(blocks)
+        self.names = [blocks[s]['name'] for s in self.symbols]
+        self.symbol_ids = {s: i for i, s in enumerate(self.symbols)}
+
+        lengths = [len(blocks[s]['columns']['window_size']) for s in self.symbols]
+        self.n_rows = int(sum(lengths))
+        self.columns = {
+            column: np.concatenate([blocks[s]['columns'][column] for s in self.symbols]) if self.symbols else np.empty(0, dtype=dtype)
+            for column, dtype in COLUMN_DTYPES.items()
+        }
+        self.columns['symbol_id'] = np.repeat(np.arange(len(self.symbols), dtype='int32'), lengths)
+
+        # Sorted indexes: row order and the column values in that order
+        index_dtype = 'int32' if self.n_rows < 2**31 else 'int64'
+        self.indexes = {}
+        for column in INDEXED_COLUMNS:
+            order = np.argsort(self.columns[column], kind='stable').astype(index_dtype)
+            self.indexes[column] = (order, self.columns[column][order])
+
+    def _index_range(self, column, low, high):
+        order, sorted_values = self.indexes[column]
+        low, high = _column_bound(column, low), _column_bound(column, high)
+        lo = 0 if low is None else np.searchsorted(sorted_values, low, side='left')
+        hi = len(order) if high is None else np.searchsorted(sorted_values, high, side='right')
+        return lo, hi
+
+    def select(self, ranges, symbols=None, min_filters=None):
+        """
+        Returns the row ids (ascending) matching all ranges ({column: (low, high)},
+        inclusive), the symbol list and the minimum filters ({column: low}).
+        The narrowest indexed range is taken from its index and the rest is masked.
+        """
+        indexed = {c: r for c, r in ranges.items() if c in self.indexes}
+        if indexed:
+            spans = {c: self._index_range(c, *r) for c, r in indexed.items()}
+            driver = min(spans, key=lambda c: spans[c][1] - spans[c][0])
+            lo, hi = spans[driver]
+            rows = np.sort(self.indexes[driver][0][lo:hi])
+        else:
+            driver = None
+            rows = np.arange(self.n_rows)
+
+        mask = np.ones(len(rows), dtype=bool)
+        for column, (low, high) in ranges.items():
+            if column == driver:
+                continue
+            values = self.columns[column][rows]
+            low, high = _column_bound(column, low), _column_bound(column, high)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        for column, low in (min_filters or {}).items():
+            mask &= self.columns[column][rows] >= _column_bound(column, low)
+        if symbols:
+            wanted = [self.symbol_ids[s] for s in symbols if s in self.symbol_ids]
+            mask &= np.isin(self.columns['symbol_id'][rows], wanted)
+        return rows[mask]
+
+def _smallest(key, needed):
+    """
+    Positions of the `needed` smallest keys; ties at the cut-off go to the
+    earliest positions, so the result matches a stable sort.
+    """
+    if needed >= len(key):
+        return np.arange(len(key))
+    cutoff = np.partition(key, needed - 1)[needed - 1]
+    below = np.flatnonzero(key < cutoff)
+    tied = np.flatnonzero(key == cutoff)[:needed - len(below)]
+    return np.concatenate([below, tied])
+
+class _Snapshot:
+    """
+    Immutable view over all loaded reports, split into SEGMENT_COUNT segments.
+    Queries run against a snapshot, so a reload never changes data mid-query,
+    and a reload only rebuilds the segments of the reports that changed.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+        self.n_rows = sum(segment.n_rows for segment in segments)
+        by_symbol = sorted((s, n) for segment in segments for s, n in zip(segment.symbols, segment.names))
+        self.symbols = [s for s, _ in by_symbol]
+        self.names = [n for _, n in by_symbol]
+        # Position of each segment symbol in the overall symbol order
+        rank = {s: i for i, s in enumerate(self.symbols)}
+        self.symbol_ranks = [np.array([rank[s] for s in segment.symbols], dtype='int32') for segment in segments]
+
+    def select(self, ranges, symbols=None, min_filters=None):
+        """Returns [(segment index, row ids)] of the segments with matching rows."""
+        selections = []
+        for i, segment in enumerate(self.segments):
+            if not segment.n_rows or (symbols and not any(s in segment.symbol_ids for s in symbols)):
+                continue
+            rows = segment.select(ranges, symbols, min_filters)
+            if len(rows):
+                selections.append((i, rows))
+        return selections
+
+    def sort_page(self, selections, sort_by, ascending, offset, limit):
+        """
+        Orders the selected rows by sort_by, then symbol and report row, and returns
+        only the requested page as (segment indexes, row ids). Each segment only
+        contributes its first offset + limit rows to the final sort.
+        """
+        needed = offset + limit
+        segment_ids, symbol_ranks, row_ids, keys = [], [], [], []
+        for i, rows in selections:
+            segment = self.segments[i]
+            if sort_by is None:
+                key = np.zeros(len(rows))
+            elif sort_by == 'symbol':
+                key = self.symbol_ranks[i][segment.columns['symbol_id'][rows]].astype(float)
+            else:
+                key = segment.columns[sort_by][rows].astype(float)
+            if not ascending:
+                key = -key
+            key = np.where(np.isnan(key), np.inf, key)  # NaN always last
+
+            # Within a segment, row order is symbol order, so ties keep the earliest rows
+            top = _smallest(key, needed)
+            segment_ids.append(np.full(len(top), i, dtype='int32'))
+            symbol_ranks.append(self.symbol_ranks[i][segment.columns['symbol_id'][rows[top]]])
+            row_ids.append(rows[top])
+            keys.append(key[top])
+
+        if not keys:
+            return np.empty(0, dtype='int32'), np.empty(0, dtype='int64')
+        segment_ids, symbol_ranks, row_ids, keys = (np.concatenate(a) for a in (segment_ids, symbol_ranks, row_ids, keys))
+        page = np.lexsort((row_ids, symbol_ranks, keys))[offset:needed]
+        return segment_ids[page], row_ids[page]
+
+    def to_records(self, segment_ids, rows):
+        records = []
+        for i, row in zip(segment_ids, rows):
+            segment = self.segments[i]
+            symbol_id = segment.columns['symbol_id'][row]
+            record = {
+                'Stock Symbol': segment.symbols[symbol_id],
+                'Stock Name': segment.names[symbol_id],
+            }
+            for column in COLUMN_DTYPES:
+                value = segment.columns[column][row].item()
+                record[column] = None if isinstance(value, float) and np.isnan(value) else value
+            records.append(record)
+        return records
+
+class SlotStore:
+    """
+    In-memory store of every L2 report in reports_folder with sorted indexes.
+    Call refresh() (or start_auto_reload()) to pick up reports rewritten by L2.
+    """
+
+    def __init__(self, reports_folder=results_folder, load=True):
+        self.reports_folder = reports_folder
+        self._blocks = {}
+        self._signatures = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._snapshot = _Snapshot([_Segment({}) for _ in range(SEGMENT_COUNT)])
+        self.loaded_at = None
+        self._stop_event = threading.Event()
+        if load:
+            self.refresh(wait_for_settle=False)
+
+    def refresh(self, wait_for_settle=True):
+        """
+        Reloads reports that were added, rewritten or removed since the last load.
+        With wait_for_settle, a changed file is only loaded once its size and mtime
+        are unchanged across two polls, so half-written L2 reports are skipped.
+        All changes found in one call are applied together, rebuilding only the
+        segments they fall into. Returns the list of reloaded symbols.
+        """
+        if not os.path.exists(self.reports_folder):
+            return []
+
+        # The poll thread and /reload may both refresh; only one diffs and swaps at a time
+        with self._lock:
+            current = {}
+            for filename in os.listdir(self.reports_folder):
+                if filename.endswith(".csv"):
+                    try:
+                        current[filename] = _file_signature(os.path.join(self.reports_folder, filename))
+                    except FileNotFoundError:
+                        continue
+
+            changed = []
+            for filename, signature in current.items():
+                if self._signatures.get(filename) == signature:
+                    continue
+                if wait_for_settle and self._pending.get(filename) != signature:
+                    self._pending[filename] = signature
+                    continue
+                changed.append(filename)
+            removed = [f for f in self._signatures if f not in current]
+
+            if not changed and not removed:
+                return []
+
+            blocks = dict(self._blocks)
+            dirty = set()
+            for filename in removed:
+                stock_symbol = filename.replace('.csv', '')
+                blocks.pop(stock_symbol, None)
+                self._signatures.pop(filename, None)
+                dirty.add(_segment_of(stock_symbol))
+            for filename in changed:
+                try:
+                    columns, stock_symbol, stock_name = load_report_columns(os.path.join(self.reports_folder, filename))
+                except Exception as e:
+                    print(f"[{datetime.now()}] Could not load {filename}: {e}")
+                    continue
+                blocks[stock_symbol] = {'columns': columns, 'name': stock_name}
+                self._signatures[filename] = current[filename]
+                self._pending.pop(filename, None)
+                dirty.add(_segment_of(stock_symbol))
+
+            # Build the changed segments off to the side and swap in a new snapshot
+            segments = list(self._snapshot.segments)
+            for segment in dirty:
+                segments[segment] = _Segment({s: b for s, b in blocks.items() if _segment_of(s) == segment})
+            self._blocks = blocks
+            self._snapshot = _Snapshot(segments)
+            self.loaded_at = datetime.now()
+
+            reloaded = [f.replace('.csv', '') for f in changed + removed]
+            print(f"[{self.loaded_at}] Loaded {len(self._blocks)} reports ({self._snapshot.n_rows} slots); "
+                  f"reloaded {len(reloaded)}, rebuilt {len(dirty)} of {SEGMENT_COUNT} segments.")
+            return reloaded
+
+    def start_auto_reload(self, interval=RELOAD_INTERVAL):
+        """Polls the reports folder in a daemon thread and hot-reloads changed reports."""
+        def _poll():
+            while not self._stop_event.wait(interval):
+                try:
+                    self.refresh()
+                except Exception as e:
+                    print(f"[{datetime.now()}] Reload failed: {e}")
+
+        thread = threading.Thread(target=_poll, name="slot-store-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def stop_auto_reload(self):
+        self._stop_event.set()
+
+    def status(self):
+        snapshot = self._snapshot
+        return {
+            'reports_folder': self.reports_folder,
+            'stocks': len(snapshot.symbols),
+            'slots': snapshot.n_rows,
+            'loaded_at': self.loaded_at.isoformat() if self.loaded_at else None,
+        }
+
+    def symbols(self):
+        snapshot = self._snapshot
+        return [{'Stock Symbol': s, 'Stock Name': n} for s, n in zip(snapshot.symbols, snapshot.names)]
+
+    def query(self, symbols=None, window_min=None, window_max=None, start_day_min=None, start_day_max=None,
+              start_month=None, consistency_min=None, consistency_max=None, median_return_min=None,
+              min_return_min=None, total_years_min=None, sort_by='median_return', ascending=False,
+              page=1, page_size=DEFAULT_PAGE_SIZE):
+        """
+        Filters, sorts and paginates the slots of every loaded report.
+        Returns a dict with the total match count, the page info and the rows.
+        """
+        snapshot = self._snapshot
+        started = time.perf_counter()
+
+        if sort_by is not None and sort_by != 'symbol' and sort_by not in COLUMN_DTYPES:
+            raise ValueError(f"Cannot sort by '{sort_by}'")
+        page = max(int(page), 1)
+        page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+
+        if start_month is not None:
+            start_month = int(start_month)
+            if not 1 <= start_month <= 12:
+                raise ValueError("start_month must be between 1 and 12")
+            month_first, month_last = MONTH_START_DAYS[start_month - 1], MONTH_START_DAYS[start_month] - 1
+            start_day_min = month_first if start_day_min is None else max(start_day_min, month_first)
+            start_day_max = month_last if start_day_max is None else min(start_day_max, month_last)
+
+        ranges = {}
+        for column, low, high in (
+            ('window_size', window_min, window_max),
+            ('start_day', start_day_min, start_day_max),
+            ('consistency', consistency_min, consistency_max),
+        ):
+            if low is not None or high is not None:
+                ranges[column] = (low, high)
+        min_filters = {
+            column: low for column, low in (
+                ('median_return', median_return_min),
+                ('min_return', min_return_min),
+                ('total_years', total_years_min),
+            ) if low is not None
+        }
+
+        selections = snapshot.select(ranges, symbols, min_filters)
+        total = sum(len(rows) for _, rows in selections)
+        segment_ids, page_rows = snapshot.sort_page(selections, sort_by, ascending, (page - 1) * page_size, page_size)
+
+        return {
+            'total': int(total),
+            'page': page,
+            'page_size': page_size,
+            'total_pages': int(-(-total // page_size)),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+            'rows': snapshot.to_records(segment_ids, page_rows),
+        }
+
+# --- HTTP Server ---
+
+# Query string parameter -> converter for SlotStore.query
+QUERY_PARAMS = {
+    'window_min': int, 'window_max': int,
+    'start_day_min': int, 'start_day_max': int, 'start_month': int,
+    'consistency_min': float, 'consistency_max': float,
+    'median_return_min': float, 'min_return_min': float, 'total_years_min': int,
+    'sort_by': str, 'page': int, 'page_size': int,
+}
+
+def _parse_query_params(query_string):
+    params = urllib.parse.parse_qs(query_string)
+    kwargs = {}
+    for name, convert in QUERY_PARAMS.items():
+        if name in params:
+            kwargs[name] = convert(params[name][0])
+    if 'order' in params:
+        kwargs['ascending'] = params['order'][0].lower().startswith('asc')
+    if 'symbol' in params:
+        kwargs['symbols'] = [s.strip().upper() for value in params['symbol'] for s in value.split(',') if s.strip()]
+    return kwargs
+
+def make_handler(store):
+    """Builds a request handler class bound to the given SlotStore."""
+
+    class SlotQueryHandler(BaseHTTPRequestHandler):
+        def _send_json(self, payload, status=200):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            try:
+                if url.path == '/query':
+                    self._send_json(store.query(**_parse_query_params(url.query)))
+                elif url.path == '/symbols':
+                    self._send_json(store.symbols())
+                elif url.path == '/status':
+                    self._send_json(store.status())
+                elif url.path == '/reload':
+                    self._send_json({'reloaded': store.refresh(wait_for_settle=False)})
+                else:
+                    self._send_json({'error': f"Unknown path {url.path}"}, status=404)
+            except ValueError as e:
+                self._send_json({'error': str(e)}, status=400)
+
+        def log_message(self, format, *args):
+            # Keep the console for load/reload messages
+            pass
+
+    return SlotQueryHandler
+
+def serve(reports_folder=results_folder, host=DEFAULT_HOST, port=DEFAULT_PORT, reload_interval=RELOAD_INTERVAL):
+    """Loads the slot store and serves it over HTTP until interrupted."""
+    print(f"[{datetime.now()}] Loading L2 reports from {reports_folder}...")
+    store = SlotStore(reports_folder)
+    if reload_interval > 0:
+        store.start_auto_reload(reload_interval)
+
+    server = ThreadingHTTPServer((host, port), make_handler(store))
+    print(f"[{datetime.now()}] Serving slot queries on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        store.stop_auto_reload()
+        server.server_close()
+
+# --- Python Client ---
+
+class SlotQueryClient:
+    """
+    Thin client for a running query server; returns pandas DataFrames.
+    """
+
+    def __init__(self, base_url=f"http://{DEFAULT_HOST}:{DEFAULT_PORT}", timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, path, params=None):
+        url = f"{self.base_url}{path}"
+        if params:
+            url += "?" + urllib.parse.urlencode(params)
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def query(self, symbols=None, ascending=False, **filters):
+        """Runs a query and returns the page as a DataFrame (match count in df.attrs['total'])."""
+        params = {k: v for k, v in filters.items() if v is not None}
+        params['order'] = 'asc' if ascending else 'desc'
+        if symbols:
+            params['symbol'] = ",".join(symbols)
+        result = self._get('/query', params)
+        df = pd.DataFrame(result['rows'])
+        df.attrs.update({k: v for k, v in result.items() if k != 'rows'})
+        return df
+
+    def symbols(self):
+        return pd.DataFrame(self._get('/symbols'))
+
+    def status(self):
+        return self._get('/status')
+
+    def reload(self):
+        return self._get('/reload')['reloaded']
+
+def main():
+    """Main function to parse arguments and start the server."""
+    parser = argparse.ArgumentParser(description="Serve in-memory queries over the L2 seasonal slot reports.")
+    parser.add_argument("--reports-folder", type=str, default=results_folder, help="Folder with the L2 reports.")
+    parser.add_argument("--host", type=str, default=DEFAULT_HOST, help="Host to bind to.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on.")
+    parser.add_argument("--reload-interval", type=float, default=RELOAD_INTERVAL, help="Seconds between reload polls (0 disables hot reload).")
+    args = parser.parse_args()
+
+    serve(args.reports_folder, args.host, args.port, args.reload_interval)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# L2_work_queue.py
+#
+# Description:
+# Work-queue mode for the L2 batch analysis. Stock symbols are put in a lease
+# table (a SQLite file on a filesystem all workers can see) and any number of
+# worker processes, on one host or many, claim them one at a time.
+#
+# - A claim is a lease that expires; workers heartbeat to extend it while they work.
+# - A lease that expires (crashed or hung worker) is handed to the next worker.
+# - Reports are written atomically (save_report), so a symbol analyzed twice after a
+#   lease takeover is simply overwritten with identical results.
+#
+# Usage:
+# 1. Put every L1 stock in the queue (already queued symbols are left alone):
+#    python L2_work_queue.py enqueue --db /shared/l2_queue.sqlite
+#
+# 2. Start workers, on as many hosts as you like:
+#    python L2_work_queue.py worker --db /shared/l2_queue.sqlite
+#
+# 3. Or enqueue and run N local worker processes in one go:
+#    python L2_work_queue.py run-local --db l2_queue.sqlite --workers 4
+#
+# 4. Check progress:
+#    python L2_work_queue.py status --db /shared/l2_queue.sqlite
+#
+
+import os
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+
+import L2_run_seasonal_analysis as L2
+
+DEFAULT_DB = os.path.join(L2.results_folder, "l2_work_queue.sqlite")
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 60
+POLL_SECONDS = 10
+MAX_ATTEMPTS = 3
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    symbol TEXT PRIMARY KEY,
+    stock_file TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    updated_at REAL
+)
+"""
+
+def connect(db_path):
+    """
+    Opens the queue database. The default rollback journal (not WAL) is used
+    because WAL needs shared memory, which hosts sharing a network filesystem do not have.
+    """
+    conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+    conn.execute(SCHEMA)
+    return conn
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue(db_path, data_folder=L2.data_folder, symbols=None, requeue_done=False, retry_failed=False):
+    """
+    Adds every stock in data_folder (or only `symbols`) to the queue. Symbols already
+    queued are left as they are unless requeue_done / retry_failed reset them.
+    Returns the number of jobs that became pending.
+    """
+    stock_files = sorted([f for f in os.listdir(data_folder) if f.endswith(".csv")])
+    wanted = {s.upper() for s in symbols} if symbols else None
+
+    conn = connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        pending = 0
+        now = time.time()
+        for stock_file in stock_files:
+            symbol = stock_file.replace('.csv', '').split(' - ')[0]
+            if wanted is not None and symbol not in wanted:
+                continue
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (symbol, stock_file, status, updated_at) VALUES (?, ?, ?, ?)",
+                (symbol, stock_file, PENDING, now),
+            )
+            pending += cursor.rowcount
+
+        reset_statuses = [s for s, flag in ((DONE, requeue_done), (FAILED, retry_failed)) if flag]
+        for status in reset_statuses:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, lease_expires = NULL, attempts = 0, updated_at = ? WHERE status = ?"
+                + ("" if wanted is None else f" AND symbol IN ({','.join('?' * len(wanted))})"),
+                (PENDING, now, status, *(sorted(wanted) if wanted else ())),
+            )
+            pending += cursor.rowcount
+        conn.execute("COMMIT")
+        return pending
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def claim(conn, worker_id, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+    """
+    Leases the next pending job, or a leased job whose lease has expired.
+    Returns (symbol, stock_file) or None if nothing is claimable right now.
+    """
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Expired leases that used up their attempts will not be retried again
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = 'Lease expired too many times', updated_at = ? "
+            "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+            (FAILED, now, LEASED, now, max_attempts),
+        )
+        row = conn.execute(
+            "SELECT symbol, stock_file FROM jobs "
+            "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+            "ORDER BY attempts, symbol LIMIT 1",
+            (PENDING, LEASED, now),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE symbol = ?",
+                (LEASED, worker_id, now + lease_seconds, now, row[0]),
+            )
+        conn.execute("COMMIT")
+        return row
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def heartbeat(conn, worker_id, symbol, lease_seconds=LEASE_SECONDS):
+    """Extends a lease. Returns False if the lease was lost to another worker."""
+    now = time.time()
+    cursor = conn.execute(
+        "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE symbol = ? AND worker = ? AND status = ?",
+        (now + lease_seconds, now, symbol, worker_id, LEASED),
+    )
+    return cursor.rowcount == 1
+
+def complete(conn, worker_id, symbol, result, success=True):
+    """
+    Marks a leased job done (or failed). Ignored if the lease was taken over in the
+    meantime; the other worker writes the same report and completes it instead.
+    """
+    cursor = conn.execute(
+        "UPDATE jobs SET status = ?, result = ?, lease_expires = NULL, updated_at = ? WHERE symbol = ? AND worker = ? AND status = ?",
+        (DONE if success else FAILED, result, time.time(), symbol, worker_id, LEASED),
+    )
+    return cursor.rowcount == 1
+
+def queue_status(db_path):
+    """Returns {status: count} plus the number of leases that have expired."""
+    conn = connect(db_path)
+    try:
+        counts = {status: 0 for status in (PENDING, LEASED, DONE, FAILED)}
+        counts.update(dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()))
+        counts['expired_leases'] = conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND lease_expires < ?", (LEASED, time.time())
+        ).fetchone()[0]
+        return counts
+    finally:
+        conn.close()
+
+class _Heartbeat(threading.Thread):
+    """Extends the current lease every `interval` seconds until stopped."""
+
+    def __init__(self, db_path, worker_id, symbol, lease_seconds, interval):
+        super().__init__(daemon=True)
+        self.db_path, self.worker_id, self.symbol = db_path, worker_id, symbol
+        self.lease_seconds, self.interval = lease_seconds, interval
+        self.stop_event = threading.Event()
+        self.lease_lost = False
+
+    def run(self):
+        # sqlite3 connections cannot be shared across threads
+        conn = connect(self.db_path)
+        try:
+            while not self.stop_event.wait(self.interval):
+                if not heartbeat(conn, self.worker_id, self.symbol, self.lease_seconds):
+                    self.lease_lost = True
+                    print(f"[{datetime.now()}] {self.worker_id}: lease on {self.symbol} was lost")
+                    return
+        finally:
+            conn.close()
+
+def run_worker(db_path, data_folder=L2.data_folder, results_folder=L2.results_folder, worker_id=None,
+               lease_seconds=LEASE_SECONDS, heartbeat_seconds=HEARTBEAT_SECONDS, poll_seconds=POLL_SECONDS,
+               max_attempts=MAX_ATTEMPTS, compact=False):
+    """
+    Claims and analyzes stocks until the queue has nothing pending or leased.
+    While other workers still hold leases, it keeps polling in case one expires.
+    Returns the number of stocks this worker processed.
+    """
+    worker_id = worker_id or default_worker_id()
+    if not os.path.exists(results_folder):
+        os.makedirs(results_folder, exist_ok=True)
+
+    conn = connect(db_path)
+    processed = 0
+    print(f"[{datetime.now()}] Worker {worker_id} started.")
+    try:
+        while True:
+            job = claim(conn, worker_id, lease_seconds, max_attempts)
+            if job is None:
+                remaining = conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?)", (PENDING, LEASED)).fetchone()[0]
+                if remaining == 0:
+                    break
+                time.sleep(poll_seconds)
+                continue
+
+            symbol, stock_file = job
+            beat = _Heartbeat(db_path, worker_id, symbol, lease_seconds, heartbeat_seconds)
+            beat.start()
+            try:
+                result = L2._run_and_save_single_stock_analysis(stock_file, data_folder, results_folder, compact)
+            finally:
+                beat.stop_event.set()
+                beat.join()
+
+            success = not result.startswith("Error")
+            complete(conn, worker_id, symbol, result, success)
+            processed += 1
+            print(f"[{datetime.now()}] {worker_id}: {result}")
+    finally:
+        conn.close()
+
+    print(f"[{datetime.now()}] Worker {worker_id} finished after {processed} stocks.")
+    return processed
+
+def run_local(db_path, data_folder=L2.data_folder, results_folder=L2.results_folder, workers=None, **worker_kwargs):
+    """Enqueues every stock and runs `workers` local worker processes until the queue is drained."""
+    added = enqueue(db_path, data_folder)
+    print(f"[{datetime.now()}] {added} stocks queued in {db_path}.")
+
+    workers = workers or multiprocessing.cpu_count()
+    processes = [
+        multiprocessing.Process(target=run_worker, args=(db_path, data_folder, results_folder), kwargs=worker_kwargs)
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    status = queue_status(db_path)
+    print(f"[{datetime.now()}] Queue status: {status}")
+    return status
+
+def main():
+    """Main function to parse arguments and run a queue command."""
+    parser = argparse.ArgumentParser(description="Distributed L2 batch analysis through a lease-based work queue.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(sub):
+        sub.add_argument("--db", type=str, default=DEFAULT_DB, help="Path of the queue database (on a shared filesystem for multi-host runs).")
+        sub.add_argument("--data-folder", type=str, default=L2.data_folder, help="Folder with the L1 historical data.")
+
+    def add_worker_options(sub):
+        sub.add_argument("--reports-folder", type=str, default=L2.results_folder, help="Folder for the L2 reports.")
+        sub.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS, help="How long a claim lasts without a heartbeat.")
+        sub.add_argument("--heartbeat-seconds", type=float, default=HEARTBEAT_SECONDS, help="How often a lease is extended.")
+        sub.add_argument("--poll-seconds", type=float, default=POLL_SECONDS, help="Wait between claims while others hold leases.")
+        sub.add_argument("--max-attempts", type=int, default=MAX_ATTEMPTS, help="Give up on a symbol after this many expired leases.")
+        sub.add_argument("--compact", action="store_true", help="Write Pareto-pruned compact L2 reports.")
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="Add L1 stocks to the queue.")
+    add_common(enqueue_parser)
+    enqueue_parser.add_argument("--symbols", nargs="+", help="Only enqueue these symbols.")
+    enqueue_parser.add_argument("--requeue-done", action="store_true", help="Put finished symbols back in the queue.")
+    enqueue_parser.add_argument("--retry-failed", action="store_true", help="Put failed symbols back in the queue.")
+
+    worker_parser = subparsers.add_parser("worker", help="Claim and analyze stocks until the queue is drained.")
+    add_common(worker_parser)
+    add_worker_options(worker_parser)
+    worker_parser.add_argument("--worker-id", type=str, help="Worker name (defaults to host:pid).")
+
+    local_parser = subparsers.add_parser("run-local", help="Enqueue everything and run several local workers.")
+    add_common(local_parser)
+    add_worker_options(local_parser)
+    local_parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to all cores).")
+
+    status_parser = subparsers.add_parser("status", help="Show queue progress.")
+    status_parser.add_argument("--db", type=str, default=DEFAULT_DB, help="Path of the queue database.")
+
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        added = enqueue(args.db, args.data_folder, args.symbols, args.requeue_done, args.retry_failed)
+        print(f"{added} stocks queued. Status: {queue_status(args.db)}")
+    elif args.command == "status":
+        print(queue_status(args.db))
+    else:
+        worker_kwargs = dict(
+            lease_seconds=args.lease_seconds,
+            heartbeat_seconds=args.heartbeat_seconds,
+            poll_seconds=args.poll_seconds,
+            max_attempts=args.max_attempts,
+            compact=args.compact,
+        )
+        if args.command == "worker":
+            run_worker(args.db, args.data_folder, args.reports_folder, worker_id=args.worker_id, **worker_kwargs)
+        else:
+            run_local(args.db, args.data_folder, args.reports_folder, workers=args.workers, **worker_kwargs)
+
+if __name__ == "__main__":
+    main()
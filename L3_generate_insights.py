@@ -1,13 +1,24 @@
 
 import pandas as pd
 import os
+import json
+import hashlib
+import inspect
 import numpy as np
 from datetime import datetime, timedelta
 
+from L2_report_format import load_slot_report
+
 # --- Configuration ---
-REPORTS_FOLDER = "/Users/gautamchaskar/Documents/NSE-Stock-Data/L2_seasonal_analysis_reports"
-INSIGHTS_FOLDER = "/Users/gautamchaskar/Documents/NSE-Stock-Data/L3_actionable_insights"
-OUTPUT_FILE = os.path.join(INSIGHTS_FOLDER, "actionable_insights.csv")
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPORTS_FOLDER = os.path.join(PROJECT_DIR, "L2_seasonal_analysis_reports")
+INSIGHTS_FOLDER = os.path.join(PROJECT_DIR, "L3_actionable_insights")
+OUTPUT_FILE_NAME = "actionable_insights.csv"
+OUTPUT_FILE = os.path.join(INSIGHTS_FOLDER, OUTPUT_FILE_NAME)
+# Best slot per L2 report, keyed by report file and its size/mtime, so unchanged reports are not re-scored.
+# The whole cache is dropped when the strategy (parameters, scoring code or CACHE_VERSION) changes.
+CACHE_FILE_NAME = "best_slots_cache.json"
+CACHE_VERSION = 1
 
 # --- Strategy Parameters (Final Version) ---
 MIN_CONSISTENCY = 0.80
@@ -21,95 +32,176 @@ def calculate_quality_score(row):
     Calculates the Quality Score for a given seasonal slot.
     Formula: (Consistency * 50%) + (Median Return * 30%) + (Risk-Adjusted Return * 20%)
     """
-    if row['Standard_Dev'] > 0:
-        risk_adjusted_return = row['median_return'] / row['Standard_Dev']
-    else:
-        risk_adjusted_return = row['median_return'] / 0.0001 # Avoid division by zero
+    return float(calculate_quality_scores(row['median_return'], row['Standard_Dev'], row['consistency']))
+
+def calculate_quality_scores(median_return, standard_dev, consistency):
+    """
+    Array version of calculate_quality_score, used to score many slots at once.
+    """
+    median_return = np.asarray(median_return, dtype=float)
+    standard_dev = np.asarray(standard_dev, dtype=float)
+    consistency = np.asarray(consistency, dtype=float)
+
+    # Avoid division by zero
+    safe_std = np.where(standard_dev > 0, standard_dev, 0.0001)
+    risk_adjusted_return = median_return / safe_std
 
-    score = (row['consistency'] * 0.5) + \
-            (row['median_return'] * 0.3) + \
+    score = (consistency * 0.5) + \
+            (median_return * 0.3) + \
             (risk_adjusted_return * 0.2)
     return score
 
-def generate_insights():
+def apply_quality_filter(df):
+    """
+    Stage 1 of the strategy: keeps only the slots that pass the minimum quality criteria.
+    """
+    return df[
+        (df['consistency'] > MIN_CONSISTENCY) &
+        (df['total_years'] >= MIN_TOTAL_YEARS) &
+        (df['min_return'] >= MIN_RETURN_THRESHOLD) &
+        (df['window_size'] >= MIN_WINDOW_SIZE) &
+        (df['window_size'] <= MAX_WINDOW_SIZE)
+    ].copy()
+
+def select_best_slot(df):
+    """
+    Runs the strategy on one L2 report and returns the formatted best slot,
+    or None if no slot passes the minimum quality filter.
+    """
+    # --- Stage 1: Minimum Quality Filter ---
+    filtered_df = apply_quality_filter(df)
+
+    if filtered_df.empty:
+        return None
+
+    # --- Stage 2: Scoring and Ranking ---
+    filtered_df['quality_score'] = filtered_df.apply(calculate_quality_score, axis=1)
+    
+    # --- Stage 3: Final Selection ---
+    best_slot = filtered_df.loc[filtered_df['quality_score'].idxmax()]
+    
+    # Format for final output
+    # Use a non-leap year for consistent date formatting
+    buy_date = (datetime(2023, 1, 1) + timedelta(days=int(best_slot['start_day']) - 1)).strftime('%b %d')
+    sell_date = (datetime(2023, 1, 1) + timedelta(days=int(best_slot['end_day']) - 1)).strftime('%b %d')
+
+    return {
+        'Stock Symbol': best_slot['Stock Symbol'],
+        'Stock Name': best_slot['Stock Name'],
+        'Buy Date': buy_date,
+        'Sell Date': sell_date,
+        'Median Return': f"{best_slot['median_return']:.2%}",
+        'Consistency': f"{best_slot['consistency']:.2%}",
+        'Min Return': f"{best_slot['min_return']:.2%}",
+        'Window Size': int(best_slot['window_size']),
+        'Quality Score': f"{best_slot['quality_score']:.2f}"
+    }
+
+def _report_signature(filepath):
+    stat = os.stat(filepath)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def strategy_signature():
+    """
+    Hash of the strategy parameters and the filtering/scoring code. Cached best
+    slots were picked under one strategy and are only reused under the same one.
+    """
+    parts = [CACHE_VERSION, MIN_CONSISTENCY, MIN_TOTAL_YEARS, MIN_RETURN_THRESHOLD, MIN_WINDOW_SIZE, MAX_WINDOW_SIZE]
+    parts += [inspect.getsource(f) for f in (calculate_quality_scores, apply_quality_filter, select_best_slot)]
+    return hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+
+def load_best_slot_cache(insights_folder=INSIGHTS_FOLDER):
+    """Returns the cached best slots by report file, or {} if they were picked under another strategy."""
+    cache_path = os.path.join(insights_folder, CACHE_FILE_NAME)
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path) as f:
+            cache = json.load(f)
+    except (json.JSONDecodeError, OSError):
+        return {}
+    if cache.get('strategy') != strategy_signature():
+        print("L3 strategy changed since the best-slot cache was written; re-scoring all reports.")
+        return {}
+    return cache['reports']
+
+def save_best_slot_cache(cache, insights_folder=INSIGHTS_FOLDER):
+    cache_path = os.path.join(insights_folder, CACHE_FILE_NAME)
+    with open(cache_path + ".tmp", 'w') as f:
+        json.dump({'strategy': strategy_signature(), 'reports': cache}, f)
+    os.replace(cache_path + ".tmp", cache_path)
+
+def is_cached(cache, filename, filepath):
+    """True if the cache holds a best slot for this exact version of the report."""
+    cached = cache.get(filename)
+    return bool(cached) and cached['signature'] == _report_signature(filepath)
+
+def generate_insights(reports_folder=REPORTS_FOLDER, insights_folder=INSIGHTS_FOLDER, use_cache=True):
     """
     Analyzes all stock seasonality reports and generates a list of actionable insights
-    based on the defined strategy.
+    based on the defined strategy. Reports whose size and mtime match the cache
+    reuse their previously selected best slot instead of being re-scored, as long
+    as the strategy has not changed since.
     """
     print("--- Starting L3 Insights Generation ---")
     
-    if not os.path.exists(REPORTS_FOLDER):
-        print(f"Error: L2 reports folder not found at {REPORTS_FOLDER}")
+    if not os.path.exists(reports_folder):
+        print(f"Error: L2 reports folder not found at {reports_folder}")
         return
     
-    if not os.path.exists(INSIGHTS_FOLDER):
-        os.makedirs(INSIGHTS_FOLDER)
+    if not os.path.exists(insights_folder):
+        os.makedirs(insights_folder)
 
     all_best_slots = []
     
-    stock_files = [f for f in os.listdir(REPORTS_FOLDER) if f.endswith(".csv")]
+    stock_files = [f for f in os.listdir(reports_folder) if f.endswith(".csv")]
     if not stock_files:
-        print(f"No L2 analysis reports found in {REPORTS_FOLDER}")
+        print(f"No L2 analysis reports found in {reports_folder}")
         return
 
     print(f"Found {len(stock_files)} stock analysis files to process.")
 
+    cache = load_best_slot_cache(insights_folder) if use_cache else {}
+    new_cache = {}
+    reused = 0
+
     for i, filename in enumerate(stock_files):
-        print(f"Processing {i+1}/{len(stock_files)}: {filename}...")
+        filepath = os.path.join(reports_folder, filename)
         
         try:
-            filepath = os.path.join(REPORTS_FOLDER, filename)
-            df = pd.read_csv(filepath)
-
-            # --- Stage 1: Minimum Quality Filter ---
-            filtered_df = df[
-                (df['consistency'] > MIN_CONSISTENCY) &
-                (df['total_years'] >= MIN_TOTAL_YEARS) &
-                (df['min_return'] >= MIN_RETURN_THRESHOLD) &
-                (df['window_size'] >= MIN_WINDOW_SIZE) &
-                (df['window_size'] <= MAX_WINDOW_SIZE)
-            ].copy()
-
-            if filtered_df.empty:
-                continue
-
-            # --- Stage 2: Scoring and Ranking ---
-            filtered_df['quality_score'] = filtered_df.apply(calculate_quality_score, axis=1)
-            
-            # --- Stage 3: Final Selection ---
-            best_slot = filtered_df.loc[filtered_df['quality_score'].idxmax()]
-            
-            # Format for final output
-            # Use a non-leap year for consistent date formatting
-            buy_date = (datetime(2023, 1, 1) + timedelta(days=int(best_slot['start_day']) - 1)).strftime('%b %d')
-            sell_date = (datetime(2023, 1, 1) + timedelta(days=int(best_slot['end_day']) - 1)).strftime('%b %d')
-
-            all_best_slots.append({
-                'Stock Symbol': best_slot['Stock Symbol'],
-                'Stock Name': best_slot['Stock Name'],
-                'Buy Date': buy_date,
-                'Sell Date': sell_date,
-                'Median Return': f"{best_slot['median_return']:.2%}",
-                'Consistency': f"{best_slot['consistency']:.2%}",
-                'Min Return': f"{best_slot['min_return']:.2%}",
-                'Window Size': int(best_slot['window_size']),
-                'Quality Score': f"{best_slot['quality_score']:.2f}"
-            })
+            signature = _report_signature(filepath)
+            if is_cached(cache, filename, filepath):
+                best_slot = cache[filename]['best_slot']
+                reused += 1
+            else:
+                print(f"Processing {i+1}/{len(stock_files)}: {filename}...")
+                df = load_slot_report(filepath)
+                best_slot = select_best_slot(df)
+
+            new_cache[filename] = {'signature': signature, 'best_slot': best_slot}
+            if best_slot is not None:
+                all_best_slots.append(best_slot)
 
         except Exception as e:
             print(f"  -> Error processing {filename}: {e}")
 
+    if use_cache:
+        save_best_slot_cache(new_cache, insights_folder)
+    if reused:
+        print(f"Reused cached results for {reused}/{len(stock_files)} unchanged reports.")
+
     if not all_best_slots:
         print("\nNo actionable insights found with the current strict strategy.")
         return
 
     # --- Create and save the final CSV ---
+    output_file = os.path.join(insights_folder, OUTPUT_FILE_NAME)
     insights_df = pd.DataFrame(all_best_slots)
     insights_df.sort_values(by='Quality Score', ascending=False, inplace=True)
-    insights_df.to_csv(OUTPUT_FILE, index=False)
+    insights_df.to_csv(output_file, index=False)
     
     print(f"\nSuccessfully generated {len(insights_df)} actionable insights.")
-    print(f"Output saved to: {OUTPUT_FILE}")
+    print(f"Output saved to: {output_file}")
 
 
 if __name__ == "__main__":
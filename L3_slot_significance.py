@@ -0,0 +1,246 @@
+# L3_slot_significance.py
+#
+# Description:
+# Optional significance stage for the slots that survive the L3 quality filter.
+# A consistency like 4/5 positive years is easy to hit by chance when 133k windows
+# are tested per stock, so every surviving slot gets:
+#   - a bootstrap confidence interval for its median return (years resampled with replacement)
+#   - a permutation p-value: how often a randomly timed entry (a random start day in each year,
+#     same window size) reaches the same median return
+#   - a multiple-testing corrected p-value across every slot tested in the universe
+#
+# Resampling is batched and seeded in NumPy, and stocks are spread across processes.
+#
+# Usage:
+# 1. Test every L3 survivor with the default settings:
+#    python L3_slot_significance.py
+#
+# 2. More resamples and a stricter correction:
+#    python L3_slot_significance.py --resamples 10000 --correction bonferroni
+#
+
+import os
+import glob
+import zlib
+import argparse
+import concurrent.futures
+import numpy as np
+import pandas as pd
+from tqdm import tqdm
+
+import L2_run_seasonal_analysis as L2
+import L3_generate_insights as L3
+from L2_report_format import load_slot_report
+
+OUTPUT_FILE = os.path.join(L3.INSIGHTS_FOLDER, "slot_significance.csv")
+
+# --- Significance Parameters ---
+N_RESAMPLES = 2000
+CONFIDENCE_LEVEL = 0.95
+ALPHA = 0.05
+RANDOM_SEED = 42
+
+def benjamini_hochberg(p_values):
+    """
+    Benjamini-Hochberg adjusted p-values (false discovery rate).
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    n = len(p_values)
+    if n == 0:
+        return p_values
+    order = np.argsort(p_values)
+    ranked = p_values[order] * n / np.arange(1, n + 1)
+    # Enforce monotonicity from the largest p-value downwards
+    ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+    adjusted = np.empty(n)
+    adjusted[order] = np.minimum(ranked, 1.0)
+    return adjusted
+
+def bonferroni(p_values):
+    """
+    Bonferroni adjusted p-values (family-wise error rate).
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    return np.minimum(p_values * len(p_values), 1.0)
+
+CORRECTIONS = {
+    'bh': benjamini_hochberg,
+    'bonferroni': bonferroni,
+}
+
+def bootstrap_median_ci(yearly_returns, rng, n_resamples=N_RESAMPLES, confidence_level=CONFIDENCE_LEVEL, batch_size=64):
+    """
+    Percentile bootstrap confidence intervals for the median of many slots at once.
+
+    `yearly_returns` is a (slots, years) matrix without NaN. One (n_resamples, years)
+    index batch is drawn and shared by every slot, and the slots are processed
+    batch_size at a time to bound memory. Returns (ci_low, ci_high) arrays.
+    """
+    n_slots, n_years = yearly_returns.shape
+    idx = rng.integers(0, n_years, size=(n_resamples, n_years))
+    tail = (1 - confidence_level) / 2 * 100
+
+    ci_low = np.empty(n_slots)
+    ci_high = np.empty(n_slots)
+    for start in range(0, n_slots, batch_size):
+        batch = yearly_returns[start:start + batch_size]
+        medians = np.median(batch[:, idx], axis=2)
+        ci_low[start:start + batch_size], ci_high[start:start + batch_size] = np.percentile(medians, [tail, 100 - tail], axis=1)
+    return ci_low, ci_high
+
+def random_timing_null(window_returns, year_mask, rng, n_resamples=N_RESAMPLES):
+    """
+    Null distribution of the median return for randomly timed entries.
+
+    `window_returns` is the (years, start_days) matrix of one window size. For every
+    resample a start day is drawn independently in each year where the slot traded,
+    and the median of those yearly returns is taken. Start days without data in a
+    year are never drawn.
+    """
+    rows = window_returns[year_mask]
+    valid_counts = np.sum(~np.isnan(rows), axis=1)
+    # Sorting NaN to the end lets a uniform draw in [0, valid_count) index only real returns
+    packed = np.sort(rows, axis=1)
+    draws = (rng.random((n_resamples, len(rows))) * valid_counts).astype('int64')
+    samples = packed[np.arange(len(rows)), draws]
+    return np.median(samples, axis=1)
+
+def test_stock_slots(args):
+    """
+    Runs the bootstrap and permutation tests for all L3 survivors of one stock.
+    Returns a list of result dicts (empty if nothing survives the filter).
+    """
+    report_path, data_folder, n_resamples, confidence_level, seed = args
+    stock_symbol = os.path.basename(report_path).replace('.csv', '')
+
+    report_df = load_slot_report(report_path)
+    survivors = L3.apply_quality_filter(report_df)
+    if survivors.empty:
+        return []
+
+    l1_files = glob.glob(os.path.join(data_folder, f"{stock_symbol} - *.csv"))
+    if not l1_files:
+        raise FileNotFoundError(f"No L1 data file found for {stock_symbol}")
+    df = L2.load_stock_data(os.path.basename(l1_files[0]), data_folder)
+
+    window_sizes = np.sort(survivors['window_size'].astype(int).unique())
+    _, returns = L2.compute_yearly_slot_returns(df, window_sizes=window_sizes)
+    # (windows, years, start_days), so returns[w] is one window's year x start_day matrix
+    returns = returns.transpose(1, 0, 2)
+    window_pos = {w: i for i, w in enumerate(window_sizes)}
+
+    # Seed per stock so results do not depend on which process picks the stock up
+    rng = np.random.default_rng([seed, zlib.crc32(stock_symbol.encode())])
+
+    window_idx = np.array([window_pos[w] for w in survivors['window_size'].astype(int)])
+    start_days = survivors['start_day'].astype(int).to_numpy()
+    # (slots, years) matrix of every survivor's yearly returns
+    slot_returns = returns[window_idx, :, start_days - 1]
+    year_masks = ~np.isnan(slot_returns)
+
+    median_return = np.empty(len(survivors))
+    total_years = year_masks.sum(axis=1)
+    ci_low = np.empty(len(survivors))
+    ci_high = np.empty(len(survivors))
+    p_value = np.empty(len(survivors))
+
+    # Slots that traded in the same years are resampled together
+    _, group_ids = np.unique(year_masks, axis=0, return_inverse=True)
+    for group in np.unique(group_ids):
+        members = np.flatnonzero(group_ids == group)
+        year_mask = year_masks[members[0]]
+        yearly_returns = slot_returns[members][:, year_mask]
+
+        median_return[members] = np.median(yearly_returns, axis=1)
+        ci_low[members], ci_high[members] = bootstrap_median_ci(yearly_returns, rng, n_resamples, confidence_level)
+
+        # Slots of the same window share one random-timing null distribution
+        for w in np.unique(window_idx[members]):
+            same_window = members[window_idx[members] == w]
+            null_medians = random_timing_null(returns[w], year_mask, rng, n_resamples)
+            exceed = np.sum(null_medians[None, :] >= median_return[same_window][:, None], axis=1)
+            p_value[same_window] = (1 + exceed) / (1 + n_resamples)
+
+    results_df = pd.DataFrame({
+        'Stock Symbol': survivors['Stock Symbol'].to_numpy() if 'Stock Symbol' in survivors else stock_symbol,
+        'Stock Name': survivors['Stock Name'].to_numpy() if 'Stock Name' in survivors else stock_symbol,
+        'window_size': survivors['window_size'].astype(int).to_numpy(),
+        'start_day': start_days,
+        'end_day': survivors['end_day'].astype(int).to_numpy(),
+        'median_return': median_return,
+        'consistency': survivors['consistency'].to_numpy(),
+        'total_years': total_years,
+        'median_ci_low': ci_low,
+        'median_ci_high': ci_high,
+        'p_value': p_value,
+    })
+    return results_df.to_dict('records')
+
+def run_significance_analysis(reports_folder=L3.REPORTS_FOLDER, data_folder=L2.data_folder, output_file=OUTPUT_FILE,
+                              n_resamples=N_RESAMPLES, confidence_level=CONFIDENCE_LEVEL, alpha=ALPHA,
+                              correction='bh', seed=RANDOM_SEED, max_workers=None):
+    """
+    Tests every slot surviving the L3 filter across all L2 reports and saves the
+    results, including corrected p-values, to output_file.
+    """
+    print("--- Starting L3 Slot Significance Analysis ---")
+
+    if not os.path.exists(reports_folder):
+        print(f"Error: L2 reports folder not found at {reports_folder}")
+        return None
+
+    report_files = sorted([f for f in os.listdir(reports_folder) if f.endswith(".csv")])
+    if not report_files:
+        print(f"No L2 analysis reports found in {reports_folder}")
+        return None
+    print(f"Found {len(report_files)} stock analysis files to process.")
+
+    tasks = [(os.path.join(reports_folder, f), data_folder, n_resamples, confidence_level, seed) for f in report_files]
+
+    all_results = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(test_stock_slots, task): task[0] for task in tasks}
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Testing slots"):
+            try:
+                all_results.extend(future.result())
+            except Exception as e:
+                print(f"  -> Error processing {os.path.basename(futures[future])}: {e}")
+
+    if not all_results:
+        print("\nNo slots survived the L3 filter, nothing to test.")
+        return None
+
+    results_df = pd.DataFrame(all_results)
+    results_df['adjusted_p_value'] = CORRECTIONS[correction](results_df['p_value'].values)
+    results_df['significant'] = results_df['adjusted_p_value'] <= alpha
+    results_df.sort_values(by=['adjusted_p_value', 'median_return'], ascending=[True, False], inplace=True)
+
+    output_folder = os.path.dirname(output_file)
+    if output_folder and not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+    results_df.to_csv(output_file, index=False)
+
+    print(f"\nTested {len(results_df)} slots; {int(results_df['significant'].sum())} significant at "
+          f"{alpha:.0%} after {correction} correction.")
+    print(f"Output saved to: {output_file}")
+    return results_df
+
+def main():
+    """Main function to parse arguments and run the significance stage."""
+    parser = argparse.ArgumentParser(description="Bootstrap and permutation tests for the slots surviving the L3 filter.")
+    parser.add_argument("--reports-folder", type=str, default=L3.REPORTS_FOLDER, help="Folder with the L2 reports.")
+    parser.add_argument("--data-folder", type=str, default=L2.data_folder, help="Folder with the L1 historical data.")
+    parser.add_argument("--output-file", type=str, default=OUTPUT_FILE, help="CSV file to save the results to.")
+    parser.add_argument("--resamples", type=int, default=N_RESAMPLES, help="Bootstrap and permutation resamples per slot.")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE_LEVEL, help="Bootstrap confidence level.")
+    parser.add_argument("--alpha", type=float, default=ALPHA, help="Significance level after correction.")
+    parser.add_argument("--correction", choices=sorted(CORRECTIONS), default='bh', help="Multiple-testing correction.")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="Base random seed.")
+    parser.add_argument("--workers", type=int, help="Number of worker processes (defaults to all cores).")
+    args = parser.parse_args()
+
+    run_significance_analysis(args.reports_folder, args.data_folder, args.output_file, args.resamples,
+                              args.confidence, args.alpha, args.correction, args.seed, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+# L3_walk_forward_backtest.py
+#
+# Description:
+# This script checks whether the L3 strategy holds up out of sample.
+# For every year Y it re-selects each stock's best seasonal slot using only the
+# years before Y, then books the return that slot actually delivered in Y.
+#
+# The per-year slot returns come from the L2 engine (compute_yearly_slot_returns)
+# and the walk-forward itself runs as array operations over (stocks x years x slots),
+# a chunk of stocks at a time. A chunk's stocks are only loaded when it runs, so
+# memory holds one chunk of returns rather than the whole universe.
+#
+# Usage:
+# 1. Backtest the whole universe:
+#    python L3_walk_forward_backtest.py
+#
+# 2. Only book trades from a given year onwards:
+#    python L3_walk_forward_backtest.py --start-year 2010
+#
+
+import os
+import argparse
+import calendar
+import warnings
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from tqdm import tqdm
+
+import L2_run_seasonal_analysis as L2
+import L3_generate_insights as L3
+
+TRADES_FILE = "backtest_trades.csv"
+SUMMARY_FILE = "backtest_summary.csv"
+
+def load_stock_slot_returns(data_folder, stock_file, window_sizes):
+    """
+    Loads one L1 file and returns its per-year slot returns for the given window sizes.
+    """
+    df = L2.load_stock_data(stock_file, data_folder)
+    return L2.compute_yearly_slot_returns(df, window_sizes=window_sizes)
+
+def load_stock_years(data_folder, stock_file):
+    """
+    Returns the years one L1 file has data for, reading only its DATE column.
+    """
+    dates = pd.to_datetime(pd.read_csv(os.path.join(data_folder, stock_file), usecols=['DATE'])['DATE'])
+    return dates.dt.year.unique()
+
+def slots_crossing_year_end(years, window_sizes, start_days):
+    """
+    Returns a (years, windows * start_days) mask of slots whose sell date falls in the next year.
+    """
+    year_lengths = np.array([366 if calendar.isleap(int(y)) else 365 for y in years])
+    end_offsets = (np.asarray(start_days)[None, :] - 1) + np.asarray(window_sizes)[:, None]
+    return end_offsets.ravel()[None, :] >= year_lengths[:, None]
+
+def _nanmedian_axis1(values, counts):
+    """
+    Median over axis 1 ignoring NaN; np.sort pushes NaN to the end, so the middle
+    elements can be picked directly from the non-NaN counts (much faster than np.nanmedian).
+    """
+    ordered = np.sort(values, axis=1)
+    last = np.maximum(counts - 1, 0)
+    lower = np.take_along_axis(ordered, (last // 2)[:, None], axis=1)[:, 0]
+    upper = np.take_along_axis(ordered, ((last + 1) // 2)[:, None], axis=1)[:, 0]
+    return np.where(counts > 0, (lower.astype(float) + upper) / 2, np.nan)
+
+def walk_forward_select(returns, crosses_year_end):
+    """
+    Walk-forward slot selection over a block of stocks.
+
+    `returns` has shape (stocks, years, windows, start_days). For each year index k
+    the L3 filter and Quality Score are applied to the statistics of years [0, k),
+    and the best slot per stock is returned as flat (window, start_day) indices.
+    Slots of year k-1 that end inside year k are left out so no trade-year data leaks in.
+    Returns (best_idx, has_pick, stats) with best_idx/has_pick shaped (stocks, years).
+    """
+    n_stocks, n_years = returns.shape[:2]
+    flat = returns.reshape(n_stocks, n_years, -1)
+
+    best_idx = np.zeros((n_stocks, n_years), dtype='int64')
+    has_pick = np.zeros((n_stocks, n_years), dtype=bool)
+    stats = {key: np.full((n_stocks, n_years), np.nan) for key in ('median_return', 'min_return', 'consistency', 'quality_score')}
+
+    with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        for k in range(1, n_years):
+            history = flat[:, :k].copy()
+            history[:, k - 1, crosses_year_end[k - 1]] = np.nan
+
+            total_years = np.sum(~np.isnan(history), axis=1)
+            positive_years = np.sum(history > 0, axis=1)
+            median_return = _nanmedian_axis1(history, total_years)
+            min_return = np.nanmin(history, axis=1)
+            standard_dev = np.nanstd(history, axis=1)
+            consistency = positive_years / total_years
+
+            passes = (
+                (consistency > L3.MIN_CONSISTENCY) &
+                (total_years >= L3.MIN_TOTAL_YEARS) &
+                (min_return >= L3.MIN_RETURN_THRESHOLD)
+            )
+            scores = L3.calculate_quality_scores(median_return, standard_dev, consistency)
+            scores = np.where(passes, scores, -np.inf)
+
+            best = np.argmax(scores, axis=1)
+            rows = np.arange(n_stocks)
+            best_idx[:, k] = best
+            has_pick[:, k] = passes[rows, best]
+            stats['median_return'][:, k] = median_return[rows, best]
+            stats['min_return'][:, k] = min_return[rows, best]
+            stats['consistency'][:, k] = consistency[rows, best]
+            stats['quality_score'][:, k] = scores[rows, best]
+
+    return best_idx, has_pick, stats
+
+def summarize_trades(trades_df):
+    """
+    Aggregates booked trades into a per-year summary plus an 'All' row.
+    """
+    def _summary(group):
+        return pd.Series({
+            'Trades': len(group),
+            'Mean Return': group['Realized Return'].mean(),
+            'Median Return': group['Realized Return'].median(),
+            'Hit Rate': (group['Realized Return'] > 0).mean(),
+            'Worst Return': group['Realized Return'].min(),
+        })
+
+    per_year = trades_df.groupby('Year').apply(_summary, include_groups=False)
+    per_year.loc['All'] = _summary(trades_df)
+    per_year['Trades'] = per_year['Trades'].astype(int)
+    return per_year.reset_index()
+
+def run_backtest(data_folder=L2.data_folder, output_folder=L3.INSIGHTS_FOLDER, start_year=None, chunk_size=250):
+    """
+    Runs the walk-forward backtest over every stock in data_folder and saves the
+    booked trades and the per-year summary to output_folder.
+    """
+    print("--- Starting L3 Walk-Forward Backtest ---")
+
+    if not os.path.exists(data_folder):
+        print(f"Error: L1 data folder not found at {data_folder}")
+        return None
+
+    if not os.path.exists(output_folder):
+        os.makedirs(output_folder)
+
+    stock_files = sorted([f for f in os.listdir(data_folder) if f.endswith(".csv")])
+    if not stock_files:
+        print(f"No L1 data files found in {data_folder}")
+        return None
+    print(f"Found {len(stock_files)} stock files.")
+
+    window_sizes = np.arange(L3.MIN_WINDOW_SIZE, L3.MAX_WINDOW_SIZE + 1)
+    start_days = np.arange(1, 366)
+
+    # --- Stage 1: Shared year axis (DATE columns only) ---
+    stock_years = {}
+    for stock_file in tqdm(stock_files, desc="Scanning years"):
+        try:
+            stock_years[stock_file] = load_stock_years(data_folder, stock_file)
+        except Exception as e:
+            print(f"  -> Error loading {stock_file}: {e}")
+
+    if not stock_years:
+        print("No stock could be loaded.")
+        return None
+
+    all_years = np.unique(np.concatenate(list(stock_years.values())))
+    year_pos = {year: i for i, year in enumerate(all_years)}
+    crosses_year_end = slots_crossing_year_end(all_years, window_sizes, start_days)
+
+    # --- Stage 2: Walk-forward selection, a chunk of stocks at a time ---
+    trades = []
+    scanned_files = list(stock_years)
+    for chunk_start in tqdm(range(0, len(scanned_files), chunk_size), desc="Walk-forward"):
+        # Per-year slot returns from the L2 engine, aligned onto the shared year axis
+        block = np.full((min(chunk_size, len(scanned_files) - chunk_start), len(all_years), len(window_sizes), len(start_days)),
+                        np.nan, dtype='float32')
+        chunk_files = []
+        for stock_file in scanned_files[chunk_start:chunk_start + chunk_size]:
+            try:
+                years, returns = load_stock_slot_returns(data_folder, stock_file, window_sizes)
+                block[len(chunk_files), [year_pos[y] for y in years]] = returns
+            except Exception as e:
+                print(f"  -> Error loading {stock_file}: {e}")
+                continue
+            chunk_files.append(stock_file)
+        if not chunk_files:
+            continue
+        block = block[:len(chunk_files)]
+
+        best_idx, has_pick, stats = walk_forward_select(block, crosses_year_end)
+
+        flat = block.reshape(len(chunk_files), len(all_years), -1)
+        stock_idx, year_idx = np.nonzero(has_pick)
+        realized = flat[stock_idx, year_idx, best_idx[stock_idx, year_idx]]
+
+        for s, y, realized_return in zip(stock_idx, year_idx, realized):
+            # A pick with no data in the trade year (e.g. delisted) cannot be booked
+            if np.isnan(realized_return):
+                continue
+            year = int(all_years[y])
+            if start_year is not None and year < start_year:
+                continue
+
+            window_size = int(window_sizes[best_idx[s, y] // len(start_days)])
+            start_day = int(start_days[best_idx[s, y] % len(start_days)])
+            buy_date = datetime(year, 1, 1) + timedelta(days=start_day - 1)
+            sell_date = buy_date + timedelta(days=window_size)
+
+            parts = chunk_files[s].replace('.csv', '').split(' - ')
+            trades.append({
+                'Year': year,
+                'Stock Symbol': parts[0],
+                'Stock Name': parts[1] if len(parts) > 1 else parts[0],
+                'Buy Date': buy_date.strftime('%Y-%m-%d'),
+                'Sell Date': sell_date.strftime('%Y-%m-%d'),
+                'Window Size': window_size,
+                'Expected Median Return': stats['median_return'][s, y],
+                'Expected Min Return': stats['min_return'][s, y],
+                'Consistency': stats['consistency'][s, y],
+                'Quality Score': stats['quality_score'][s, y],
+                'Realized Return': float(realized_return),
+            })
+
+    if not trades:
+        print("\nNo out-of-sample trades were selected with the current strategy.")
+        return None
+
+    # --- Stage 3: Save trades and summary ---
+    trades_df = pd.DataFrame(trades).sort_values(by=['Year', 'Quality Score'], ascending=[True, False])
+    summary_df = summarize_trades(trades_df)
+
+    trades_df.to_csv(os.path.join(output_folder, TRADES_FILE), index=False)
+    summary_df.to_csv(os.path.join(output_folder, SUMMARY_FILE), index=False)
+
+    print(f"\nBooked {len(trades_df)} out-of-sample trades across {trades_df['Year'].nunique()} years.")
+    print(summary_df.to_string(index=False, formatters={
+        'Mean Return': '{:.2%}'.format,
+        'Median Return': '{:.2%}'.format,
+        'Hit Rate': '{:.2%}'.format,
+        'Worst Return': '{:.2%}'.format,
+    }))
+    print(f"Output saved to: {output_folder}")
+    return trades_df, summary_df
+
+def main():
+    """Main function to parse arguments and run the backtest."""
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the L3 seasonal strategy.")
+    parser.add_argument("--data-folder", type=str, default=L2.data_folder, help="Folder with the L1 historical data.")
+    parser.add_argument("--output-folder", type=str, default=L3.INSIGHTS_FOLDER, help="Folder to save the backtest results to.")
+    parser.add_argument("--start-year", type=int, help="Only book trades from this year onwards.")
+    parser.add_argument("--chunk-size", type=int, default=250, help="Number of stocks processed per array block.")
+    args = parser.parse_args()
+
+    run_backtest(args.data_folder, args.output_folder, args.start_year, args.chunk_size)
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,25 @@
 import streamlit as st
 import pandas as pd
 import os
-import plotly.graph_objects as go
-import seaborn as sns
-import matplotlib.pyplot as plt
+import io
 import numpy as np
-import concurrent.futures
 import subprocess
+# Plotting libraries (plotly, matplotlib, seaborn) and the seasonality cube are
+# imported inside the views that use them, so they do not slow down start-up.
 from L2_run_seasonal_analysis import (
     get_seasonal_heatmap_data, 
-    get_custom_period_analysis, 
     find_all_seasonal_slots,
     find_ma_crosses,
     find_volume_spikes,
-    run_full_batch_analysis
+    run_full_batch_analysis,
+    save_report,
+    load_stock_data,
+    data_folder,
+    results_folder
 )
+from L2_report_format import load_slot_report, COMPACT
+import L1_corporate_actions as corporate_actions
+from L1_symbol_index import load_symbol_index
 
 # --- Pandas Styler Config (to allow styling large DataFrames) ---
 pd.set_option("styler.render.max_elements", 2_000_000)
@@ -31,15 +36,120 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# --- Folder Paths ---
-data_folder = "/Users/gautamchaskar/Documents/NSE-Stock-Data/L1_historical_stock_data"
-results_folder = "/Users/gautamchaskar/Documents/NSE-Stock-Data/L2_seasonal_analysis_reports"
-
 # --- Helper Functions ---
+@st.cache_resource
+def load_seasonality_cube(cube_mtime):
+    """Loads the precomputed seasonality cube; cube_mtime invalidates the cache when it is rewritten."""
+    from L2_seasonality_cube import SeasonalityCube, CUBE_FILE
+    return SeasonalityCube.load(CUBE_FILE)
+
+def get_seasonality_cube():
+    from L2_seasonality_cube import CUBE_FILE
+    if not os.path.exists(CUBE_FILE):
+        return None
+    try:
+        return load_seasonality_cube(os.path.getmtime(CUBE_FILE))
+    except Exception:
+        return None
+
+@st.cache_resource
+def get_symbol_index(folder, folder_mtime):
+    """Symbol/company search index of the L1 folder; the folder's mtime changes whenever a file is added or removed."""
+    return load_symbol_index(folder)
+
+def _stock_data_signature(stock_file):
+    symbol = stock_file.split(' - ')[0]
+    actions_file = corporate_actions.actions_path(data_folder, symbol)
+    actions_mtime = os.path.getmtime(actions_file) if os.path.exists(actions_file) else None
+    return os.path.getmtime(os.path.join(data_folder, stock_file)), actions_mtime
+
+@st.cache_data(max_entries=16)
+def load_stock_frame(stock_file, signature):
+    """Cached load_stock_data; signature (file and corporate-action mtimes) invalidates it."""
+    return load_stock_data(stock_file)
+
+@st.cache_data(max_entries=8)
+def load_results_table(result_file_path, file_mtime):
+    """
+    Loads an L2 report and prepares it for display, once per report version, so
+    sorting and paging reruns do not re-read and re-format every slot.
+    Returns (results_df, report_info); results_df is None if no consistency column is found.
+    """
+    results_df = load_slot_report(result_file_path)
+    report_info = {
+        'compact': results_df.attrs.get('report_format') == COMPACT,
+        'total_slots': int(results_df.attrs.get('total_slots', len(results_df))),
+        'old_format': 'min_return' not in results_df.columns or 'max_return' not in results_df.columns,
+    }
+
+    # --- Handle old CSV files for min/max return ---
+    if report_info['old_format']:
+        results_df['min_return'] = np.nan
+        results_df['max_return'] = np.nan
+
+    # Ensure correct column names for display
+    start_dates = pd.to_datetime(results_df['start_day'].astype(int).astype(str), format='%j')
+    results_df['start_date'] = start_dates.dt.strftime('%B %d')
+    results_df['end_date'] = (start_dates + pd.to_timedelta(results_df['window_size'], unit='D')).dt.strftime('%B %d')
+
+    # --- Handle old CSV files for consistency column --- 
+    if 'consistency' not in results_df.columns:
+        if 'years_above_median' in results_df.columns:
+            results_df.rename(columns={'years_above_median': 'consistency'}, inplace=True)
+        elif 'positive_years' in results_df.columns and 'total_years' in results_df.columns:
+            results_df['consistency'] = results_df['positive_years'] / results_df['total_years']
+        else:
+            return None, report_info
+    # --- End handle old CSV files --- 
+
+    # Define the desired column order
+    desired_column_order = [
+        'window_size',
+        'start_date',
+        'end_date',
+        'median_return',
+        'min_return',
+        'max_return',
+        'consistency',
+        'positive_years',
+        'total_years'
+    ]
+    results_df = results_df[desired_column_order]
+
+    # Rename columns for display
+    results_df = results_df.rename(columns={
+        'window_size': 'Window Size',
+        'start_date': 'Start Date',
+        'end_date': 'End Date',
+        'median_return': 'Median Return',
+        'min_return': 'Min Return',
+        'max_return': 'Max Return',
+        'consistency': 'Consistency',
+        'positive_years': 'Positive Years',
+        'total_years': 'Total Years'
+    })
+    return results_df, report_info
+
+@st.cache_data(max_entries=32)
+def render_heatmap(heatmap_data):
+    """
+    Renders a year x month heatmap to PNG bytes. matplotlib and seaborn are imported
+    on first use, and reruns with the same data reuse the image.
+    """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    fig, ax = plt.subplots(figsize=(10, 6))
+    sns.heatmap(heatmap_data, annot=True, cmap='RdYlGn', ax=ax)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    plt.close(fig)
+    return buffer.getvalue()
+
+def draw_heatmap(heatmap_data):
+    st.image(render_heatmap(heatmap_data), width="stretch")
+
 def run_single_stock_analysis(stock_file, progress_callback=None, log_callback=None):
-    df = pd.read_csv(os.path.join(data_folder, stock_file))
-    df['DATE'] = pd.to_datetime(df['DATE'])
-    df.set_index('DATE', inplace=True)
+    df = load_stock_data(stock_file)
     
     # Call the new function to get ALL slots
     all_slots = find_all_seasonal_slots(df, progress_callback, log_callback)
@@ -57,7 +167,7 @@ def run_single_stock_analysis(stock_file, progress_callback=None, log_callback=N
         results_df['Stock Name'] = stock_name_full
         
         # Save the entire DataFrame
-        results_df.to_csv(os.path.join(results_folder, f"{stock_symbol}.csv"), index=False)
+        save_report(results_df, os.path.join(results_folder, f"{stock_symbol}.csv"))
 
 # --- Main App Title ---
 st.title("Stock Market Screener")
@@ -76,26 +186,33 @@ if st.sidebar.button("Fetch Latest Historical Data (L1)"):
             st.sidebar.success("Data fetch complete!")
             with st.sidebar.expander("See execution log"):
                 st.code(result.stdout)
+            from L2_seasonality_cube import update_seasonality_cube
+            update_seasonality_cube(data_folder)
         except subprocess.CalledProcessError as e:
             st.sidebar.error("Error during data fetch.")
             with st.sidebar.expander("See error log"):
                 st.code(e.stderr)
 
 st.sidebar.title("Stock Selection")
-stock_files = sorted([f for f in os.listdir(data_folder) if f.endswith(".csv")])
+symbol_index = get_symbol_index(data_folder, os.path.getmtime(data_folder))
 
 if 'selected_stock_file' not in st.session_state:
     st.session_state.selected_stock_file = "RELIANCE - Reliance Industries Limited.csv"
 
-search_term = st.sidebar.text_input("Search for a stock (press Enter to filter)", "")
+search_term = st.sidebar.text_input("Search by symbol or company name (press Enter to filter)", "")
 
 if search_term:
-    filtered_stocks = [s for s in stock_files if search_term.lower() in s.lower()]
-    if filtered_stocks:
-        if len(filtered_stocks) > 15:
+    # Ranked best match first; one extra result tells whether the list was cut
+    matches = symbol_index.search(search_term, limit=16)
+    if matches:
+        if len(matches) > 15:
             st.sidebar.info("Showing top 15 results.")
-            filtered_stocks = filtered_stocks[:15]
-        st.session_state.selected_stock_file = st.sidebar.radio("Select a stock from results", filtered_stocks)
+            matches = matches[:15]
+        st.session_state.selected_stock_file = st.sidebar.radio(
+            "Select a stock from results",
+            [m['file'] for m in matches],
+            format_func=lambda f: f.replace('.csv', '')
+        )
     else:
         st.sidebar.warning("No stocks found.")
 
@@ -139,77 +256,33 @@ with header_col2:
         st.success("Analysis complete! Results are now saved for future use.")
         st.experimental_rerun()
 
-# Load data
-df = pd.read_csv(os.path.join(data_folder, selected_stock_file))
-df['DATE'] = pd.to_datetime(df['DATE'])
-df.set_index('DATE', inplace=True)
+# Load data (adjusted for recorded splits and bonuses)
+df = load_stock_frame(selected_stock_file, _stock_data_signature(selected_stock_file))
 
 # --- Tabs ---
-tab_names = ["✅ Seasonality", "✅ Summary", "✅ Price Chart", "✅ Moving Averages", "✅ Volume Analysis", "✅ Volatility", "📖 Documentation"]
-tab1, tab2, tab3, tab4, tab5, tab6, tab7 = st.tabs(tab_names)
+# Only the selected view runs (st.tabs would compute and draw every tab on each rerun)
+tab_names = ["✅ Seasonality", "✅ Summary", "✅ Price Chart", "✅ Moving Averages", "✅ Volume Analysis", "✅ Volatility", "🌐 Market Seasonality", "📖 Documentation"]
+tab1, tab2, tab3, tab4, tab5, tab6, tab_market, tab7 = tab_names
+active_tab = st.radio("View", tab_names, horizontal=True, label_visibility="collapsed", key="active_tab")
 
-with tab1:
+if active_tab == tab1:
     # --- Display Results Section ---
     if os.path.exists(result_file_path):
         with st.spinner("Loading and processing existing analysis..."):
-            results_df = pd.read_csv(result_file_path)
+            results_df, report_info = load_results_table(result_file_path, os.path.getmtime(result_file_path))
+            is_compact = report_info['compact']
             
             # --- Compact Messages ---
             message = "Pre-computed analysis found."
-            is_old_format = 'min_return' not in results_df.columns or 'max_return' not in results_df.columns
-            if is_old_format:
+            if is_compact:
+                message += f" (Compact report: showing the {len(results_df):,} Pareto-optimal slots of {report_info['total_slots']:,}.)"
+            if report_info['old_format']:
                 message += " (Old format: Re-run analysis to see all columns)."
             st.info(message)
 
-            # --- Handle old CSV files for min/max return ---
-            if 'min_return' not in results_df.columns or 'max_return' not in results_df.columns:
-                results_df['min_return'] = np.nan
-                results_df['max_return'] = np.nan
-
-            # Ensure correct column names for display
-            results_df['start_date'] = results_df['start_day'].apply(lambda x: pd.to_datetime(str(x), format='%j').strftime('%B %d'))
-            results_df['end_date'] = results_df.apply(lambda row: (pd.to_datetime(str(row['start_day']), format='%j') + pd.Timedelta(days=row['window_size'])).strftime('%B %d'), axis=1)
-            
-            # --- Handle old CSV files for consistency column --- 
-            if 'consistency' not in results_df.columns:
-                if 'years_above_median' in results_df.columns:
-                    results_df.rename(columns={'years_above_median': 'consistency'}, inplace=True)
-                elif 'positive_years' in results_df.columns and 'total_years' in results_df.columns:
-                    results_df['consistency'] = results_df['positive_years'] / results_df['total_years']
-                else:
-                    st.error("Error: Could not find 'consistency' or equivalent columns in the loaded data. Please re-run the analysis.")
-                    st.stop()
-            # --- End handle old CSV files --- 
-
-            # Drop the columns we don't want to display
-            results_df.drop(columns=['Stock Symbol', 'Stock Name'], errors='ignore', inplace=True)
-
-            # Define the desired column order
-            desired_column_order = [
-                'window_size',
-                'start_date',
-                'end_date',
-                'median_return',
-                'min_return',
-                'max_return',
-                'consistency',
-                'positive_years',
-                'total_years'
-            ]
-            results_df = results_df[desired_column_order]
-
-            # Rename columns for display
-            results_df.rename(columns={
-                'window_size': 'Window Size',
-                'start_date': 'Start Date',
-                'end_date': 'End Date',
-                'median_return': 'Median Return',
-                'min_return': 'Min Return',
-                'max_return': 'Max Return',
-                'consistency': 'Consistency',
-                'positive_years': 'Positive Years',
-                'total_years': 'Total Years'
-            }, inplace=True)
+            if results_df is None:
+                st.error("Error: Could not find 'consistency' or equivalent columns in the loaded data. Please re-run the analysis.")
+                st.stop()
             
             # --- Controls for Sorting and Pagination ---
             # Sorting and Rows per page
@@ -230,6 +303,8 @@ with tab1:
 
             total_rows = len(sorted_results_df)
             total_pages = (total_rows // rows_per_page) + (1 if total_rows % rows_per_page > 0 else 0)
+            # Compact reports differ in length per stock, so the page kept from the previous stock may not exist
+            st.session_state.current_page = max(min(st.session_state.current_page, total_pages), 1)
 
             # --- Display Paginated Data ---
             start_idx = (st.session_state.current_page - 1) * rows_per_page
@@ -261,23 +336,37 @@ with tab1:
                     if st.session_state.current_page < total_pages:
                         st.session_state.current_page += 1
 
-    st.subheader("Monthly Performance Heatmap")
-    heatmap_data = get_seasonal_heatmap_data(df)
-    fig, ax = plt.subplots(figsize=(10, 6))
-    sns.heatmap(heatmap_data, annot=True, cmap='RdYlGn', ax=ax)
-    st.pyplot(fig)
+            if is_compact:
+                with st.expander("Coarse grid of all slots (mean median return by window band and start week)"):
+                    grid_df = load_slot_report(result_file_path, include_grid=True)
+                    grid_df = grid_df[grid_df['slot_kind'] == 'grid']
+                    grid_df['Start Week'] = grid_df['start_day'].apply(lambda x: pd.to_datetime(str(int(x)), format='%j').strftime('%b %d'))
+                    grid_pivot = grid_df.pivot(index='window_size', columns='Start Week', values='median_return')
+                    grid_pivot = grid_pivot[grid_df.drop_duplicates('start_day').sort_values('start_day')['Start Week']]
+                    grid_pivot.index.name = 'Window From'
+                    st.dataframe(grid_pivot.style.background_gradient(cmap='RdYlGn', axis=None).format('{:.2%}'))
 
-with tab2:
+    st.subheader("Monthly Performance Heatmap")
+    seasonality_cube = get_seasonality_cube()
+    heatmap_data = seasonality_cube.symbol_heatmap(stock_name) if seasonality_cube is not None else None
+    if heatmap_data is None:
+        # Stock not in the cube yet (or no cube built): compute from the raw data
+        heatmap_data = get_seasonal_heatmap_data(df)
+    draw_heatmap(heatmap_data)
+
+if active_tab == tab2:
     st.subheader("Data Summary")
     st.write(df.describe())
 
-with tab3:
+if active_tab == tab3:
+    import plotly.graph_objects as go
     st.subheader("Price Chart")
     fig = go.Figure(data=[go.Candlestick(x=df.index, open=df['OPEN'], high=df['HIGH'], low=df['LOW'], close=df['CLOSE'])])
     fig.update_layout(xaxis_rangeslider_visible=False, template="plotly_dark")
     st.plotly_chart(fig, use_container_width=True)
 
-with tab4:
+if active_tab == tab4:
+    import plotly.graph_objects as go
     st.header("Moving Average Analysis")
     df['MA20'] = df['CLOSE'].rolling(window=20).mean()
     df['MA50'] = df['CLOSE'].rolling(window=50).mean()
@@ -311,7 +400,8 @@ with tab4:
     else:
         st.error("The stock is currently in a **long-term downtrend** (50-day MA is below the 200-day MA).")
 
-with tab5:
+if active_tab == tab5:
+    import plotly.graph_objects as go
     st.header("Volume Analysis")
     volume_spikes = find_volume_spikes(df.copy())
     df['Volume_MA'] = df['VOLUME'].rolling(window=50).mean()
@@ -332,7 +422,8 @@ with tab5:
         st.info(f"The last significant volume spike was on **{last_spike['date'].date()}**. ")
         st.info(f"On that day, the volume was **{last_spike['volume'] / last_spike['avg_volume']:.1f}x** the average, which corresponded with a **{last_spike['price_pct_change']:.2f}%** price {direction}. This suggests strong conviction from traders.")
 
-with tab6:
+if active_tab == tab6:
+    import plotly.graph_objects as go
     st.header("Volatility Analysis (Bollinger Bands)")
     df['20_Day_MA'] = df['CLOSE'].rolling(window=20).mean()
     df['20_Day_Std'] = df['CLOSE'].rolling(window=20).std()
@@ -351,7 +442,31 @@ with tab6:
     last_bandwidth = (df['Upper_Band'].iloc[-1] - df['Lower_Band'].iloc[-1]) / df['20_Day_MA'].iloc[-1]
     st.info(f"The current Bollinger Bandwidth is **{last_bandwidth:.2%}**. A low bandwidth can indicate that the stock is in a period of low volatility, which may be followed by a significant price move (a 'squeeze'). A high bandwidth indicates high volatility.")
 
-with tab7:
+if active_tab == tab_market:
+    st.header("Market Seasonality")
+    from L2_seasonality_cube import load_sector_map
+    seasonality_cube = get_seasonality_cube()
+    if seasonality_cube is None:
+        st.info("No seasonality cube found. Build it with `python L2_seasonality_cube.py`.")
+    else:
+        st.subheader("Universe Heatmap")
+        st.caption(f"Equal-weighted mean daily return per month across {len(seasonality_cube.symbols)} stocks.")
+        draw_heatmap(seasonality_cube.aggregate_heatmap())
+
+        sector_map = load_sector_map()
+        st.subheader("Sector Heatmap")
+        if not sector_map:
+            st.info("No sector map found. Create it with `python L1_fetch_historical_data.py --update-sectors`.")
+        else:
+            selected_sector = st.selectbox("Sector", options=sorted(sector_map))
+            sector_heatmap = seasonality_cube.aggregate_heatmap(sector_map[selected_sector])
+            if sector_heatmap is None:
+                st.warning("None of the stocks in this sector are in the seasonality cube.")
+            else:
+                st.caption(f"Equal-weighted mean daily return per month across {len(sector_map[selected_sector])} stocks in {selected_sector}.")
+                draw_heatmap(sector_heatmap)
+
+if active_tab == tab7:
     st.header("📖 Project Documentation")
     try:
         with open("SEASONAL_ANALYSIS_DOCUMENTATION.md", "r") as f:
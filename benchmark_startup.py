@@ -0,0 +1,116 @@
+# benchmark_startup.py
+#
+# Description:
+# Measures cold-start cost: how long each pipeline module takes to import in a
+# fresh interpreter, and how long the Streamlit app takes for its first page
+# load, a plain rerun, and switching to another view. Every measurement runs
+# in a new process, so nothing is cached between runs.
+#
+# Usage:
+# 1. Benchmark the modules and the app (the app needs the L1 data folder):
+#    python benchmark_startup.py
+#
+# 2. Open a specific stock in the app:
+#    python benchmark_startup.py --stock "TCS - Tata Consultancy Services Limited.csv"
+#
+# 3. More runs, modules only:
+#    python benchmark_startup.py --runs 10 --skip-app
+#
+
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = [
+    "streamlit",
+    "L2_run_seasonal_analysis",
+    "L2_seasonality_cube",
+    "L3_generate_insights",
+    "run_pipeline",
+    "L2_work_queue",
+    "L2_slot_query_server",
+]
+
+# Runs the app headless with Streamlit's test harness and prints the timings as JSON
+APP_SCRIPT = """
+import json, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("app.py", default_timeout=600)
+if {stock!r}:
+    at.session_state["selected_stock_file"] = {stock!r}
+at.run()
+first = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+start = time.perf_counter()
+at.radio(key="active_tab").set_value(at.radio(key="active_tab").options[3]).run()
+switch = time.perf_counter() - start
+errors = [str(e.value) for e in at.exception]
+print(json.dumps({{"first_load": first, "rerun": rerun, "switch_view": switch, "errors": errors}}))
+"""
+
+def _run_python(code):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_DIR, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed")
+    return elapsed, result.stdout
+
+def time_imports(modules=MODULES, runs=5):
+    """Median wall time of `import module` in a fresh interpreter, minus interpreter start-up."""
+    baseline = statistics.median(_run_python("pass")[0] for _ in range(runs))
+    timings = {}
+    for module in modules:
+        try:
+            timings[module] = statistics.median(_run_python(f"import {module}")[0] for _ in range(runs)) - baseline
+        except RuntimeError as e:
+            print(f"  -> Could not import {module}: {e}")
+    return baseline, timings
+
+def time_app(runs=3, stock_file=None):
+    """Median first-load, rerun and view-switch times of app.py, each from a fresh process."""
+    results = []
+    for _ in range(runs):
+        _, output = _run_python(APP_SCRIPT.format(stock=stock_file))
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    errors = sorted({e for r in results for e in r['errors']})
+    return {key: statistics.median(r[key] for r in results) for key in ('first_load', 'rerun', 'switch_view')}, errors
+
+def main():
+    """Main function to parse arguments and print the start-up benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark module import times and the app's first load.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement (the median is reported).")
+    parser.add_argument("--skip-app", action="store_true", help="Only benchmark module imports.")
+    parser.add_argument("--stock", type=str, help="L1 file the app opens (defaults to the app's default stock).")
+    args = parser.parse_args()
+
+    print(f"--- Import times (median of {args.runs} fresh interpreters) ---")
+    baseline, timings = time_imports(runs=args.runs)
+    print(f"{'interpreter start-up':<28} {baseline:6.3f}s")
+    for module, seconds in timings.items():
+        print(f"{module:<28} {seconds:6.3f}s")
+
+    if args.skip_app:
+        return
+    print(f"\n--- app.py (median of {args.runs} fresh processes) ---")
+    try:
+        app_timings, errors = time_app(args.runs, args.stock)
+    except (RuntimeError, ValueError) as e:
+        print(f"Could not run the app: {e}")
+        return
+    for key, seconds in app_timings.items():
+        print(f"{key:<28} {seconds:6.3f}s")
+    for error in errors:
+        print(f"  -> App error: {error}")
+
+if __name__ == "__main__":
+    main()
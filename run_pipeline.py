@@ -0,0 +1,212 @@
+# run_pipeline.py
+#
+# Description:
+# Runs the L1 -> L2 -> L3 pipeline as a single command, doing only the work
+# that is needed. The runner remembers a fingerprint of every L1 file it has
+# processed; only symbols whose L1 file changed (new rows, new listing,
+# rewritten file), whose corporate-action table changed (a new split) or
+# whose L2 report is missing are re-analyzed in L2, and L3 re-scores only
+# the reports that changed, reusing cached results for the rest.
+#
+# Usage:
+# 1. Fetch, then update everything that changed:
+#    python run_pipeline.py
+#
+# 2. Show the planned work without running anything:
+#    python run_pipeline.py --dry-run
+#
+# 3. Use the data already on disk, with custom folders and 4 L2 worker processes:
+#    python run_pipeline.py --skip-fetch --data-folder /data/L1 --reports-folder /data/L2 --insights-folder /data/L3 --workers 4
+#
+
+import os
+import json
+import argparse
+import concurrent.futures
+from datetime import datetime
+from tqdm import tqdm
+
+import L1_file_tracking as tracking
+import L1_corporate_actions as corporate_actions
+import L2_run_seasonal_analysis as L2
+import L3_generate_insights as L3
+
+STATE_FILE_NAME = "pipeline_state.json"
+
+def load_state(state_file):
+    if not os.path.exists(state_file):
+        return {'l1': {}}
+    with open(state_file) as f:
+        return json.load(f)
+
+def save_state(state, state_file):
+    folder = os.path.dirname(state_file)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+    with open(state_file + ".tmp", 'w') as f:
+        json.dump(state, f)
+    os.replace(state_file + ".tmp", state_file)
+
+def plan_l2_work(data_folder, reports_folder, state, force_symbols=(), full=False):
+    """
+    Compares the L1 folder against the saved state and returns (planned, removed).
+    planned is a list of dicts (symbol, stock_file, reason, fingerprint) for every
+    symbol L2 has to re-run; removed lists symbols whose L1 file disappeared.
+    """
+    stock_files = sorted([f for f in os.listdir(data_folder) if f.endswith(".csv")])
+    force_symbols = {s.upper() for s in force_symbols}
+
+    planned = []
+    current_symbols = set()
+    for stock_file in stock_files:
+        symbol = stock_file.replace('.csv', '').split(' - ')[0]
+        current_symbols.add(symbol)
+        previous = state['l1'].get(symbol)
+        # A file renamed under the same symbol is treated as rewritten
+        previous_fingerprint = previous['fingerprint'] if previous and previous['file'] == stock_file else None
+
+        change, fingerprint, _ = tracking.classify_file_change(os.path.join(data_folder, stock_file), previous_fingerprint)
+        if previous and change == tracking.NEW:
+            change = tracking.REWRITTEN
+        actions_fingerprint = corporate_actions.actions_fingerprint(data_folder, symbol)
+
+        if full:
+            reason = "full rebuild"
+        elif symbol in force_symbols:
+            reason = "forced"
+        elif change != tracking.UNCHANGED:
+            reason = change
+        elif previous and corporate_actions.actions_changed(previous.get('actions'), actions_fingerprint):
+            reason = "corporate action"
+        elif not os.path.exists(os.path.join(reports_folder, f"{symbol}.csv")):
+            reason = "missing report"
+        else:
+            continue
+
+        planned.append({'symbol': symbol, 'stock_file': stock_file, 'reason': reason,
+                        'fingerprint': fingerprint, 'actions': actions_fingerprint})
+
+    removed = sorted(s for s in state['l1'] if s not in current_symbols)
+    return planned, removed
+
+def plan_l3_work(reports_folder, insights_folder, l2_symbols):
+    """Returns the report files L3 will re-score: those L2 rewrites plus any not matching the L3 cache."""
+    cache = L3.load_best_slot_cache(insights_folder)
+    rescore = {f"{s}.csv" for s in l2_symbols}
+    if os.path.exists(reports_folder):
+        for filename in os.listdir(reports_folder):
+            if not filename.endswith(".csv"):
+                continue
+            if not L3.is_cached(cache, filename, os.path.join(reports_folder, filename)):
+                rescore.add(filename)
+    return sorted(rescore)
+
+def print_plan(planned, removed, l3_files, fetch):
+    print(f"\n--- Planned Work ({datetime.now():%Y-%m-%d %H:%M}) ---")
+    print(f"L1: {'fetch latest data for all NSE stocks' if fetch else 'skipped (using data on disk)'}")
+
+    by_reason = {}
+    for item in planned:
+        by_reason.setdefault(item['reason'], []).append(item['symbol'])
+    print(f"L2: re-analyze {len(planned)} stocks")
+    for reason, symbols in sorted(by_reason.items()):
+        preview = ", ".join(symbols[:10]) + (f" (+{len(symbols) - 10} more)" if len(symbols) > 10 else "")
+        print(f"    {reason}: {len(symbols)} - {preview}")
+    if removed:
+        print(f"    L1 file removed (stale L2 report kept): {', '.join(removed)}")
+    print(f"L3: re-score {len(l3_files)} reports, reuse cached results for the rest")
+    if fetch:
+        print("Note: stocks updated by the L1 fetch are not listed above; they are picked up after the fetch.")
+
+def run_l2(planned, data_folder, reports_folder, state, state_file, workers=1, compact=False):
+    """Re-analyzes the planned stocks and records their fingerprints as they complete."""
+    if not os.path.exists(reports_folder):
+        os.makedirs(reports_folder)
+
+    errors = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(L2._run_and_save_single_stock_analysis, item['stock_file'], data_folder, reports_folder, compact): item
+            for item in planned
+        }
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="L2 analysis"):
+            item = futures[future]
+            result = future.result()
+            if result.startswith("Error"):
+                # Leave the state untouched so the stock is retried next run
+                print(f"  -> {result}")
+                errors += 1
+                continue
+            state['l1'][item['symbol']] = {'file': item['stock_file'], 'fingerprint': item['fingerprint'], 'actions': item['actions']}
+    save_state(state, state_file)
+    return errors
+
+def run_pipeline(data_folder=L2.data_folder, reports_folder=L2.results_folder, insights_folder=L3.INSIGHTS_FOLDER,
+                 state_file=None, fetch=True, dry_run=False, full=False, force_symbols=(), update_cube=True, workers=1,
+                 compact=False):
+    """Runs L1 (optional), then L2 and L3 only for what changed."""
+    state_file = state_file or os.path.join(reports_folder, STATE_FILE_NAME)
+    state = load_state(state_file)
+
+    if dry_run:
+        if not os.path.exists(data_folder):
+            print(f"L1 data folder not found at {data_folder}")
+            return
+        planned, removed = plan_l2_work(data_folder, reports_folder, state, force_symbols, full)
+        print_plan(planned, removed, plan_l3_work(reports_folder, insights_folder, [p['symbol'] for p in planned]), fetch)
+        print("\nDry run: nothing was changed.")
+        return
+
+    started = datetime.now()
+    if fetch:
+        print(f"[{datetime.now()}] --- L1: Fetching latest data ---")
+        # Imported here so planning and --skip-fetch runs do not need the network libraries
+        import L1_fetch_historical_data as L1
+        L1.fetch_all_stocks(data_folder)
+
+    if not os.path.exists(data_folder):
+        print(f"Error: L1 data folder not found at {data_folder}")
+        return
+
+    planned, removed = plan_l2_work(data_folder, reports_folder, state, force_symbols, full)
+    print_plan(planned, removed, plan_l3_work(reports_folder, insights_folder, [p['symbol'] for p in planned]), fetch=False)
+
+    print(f"\n[{datetime.now()}] --- L2: Seasonal analysis for {len(planned)} stocks ---")
+    errors = run_l2(planned, data_folder, reports_folder, state, state_file, workers, compact) if planned else 0
+    for symbol in removed:
+        state['l1'].pop(symbol, None)
+    save_state(state, state_file)
+
+    if update_cube:
+        print(f"\n[{datetime.now()}] --- L2: Seasonality cube ---")
+        from L2_seasonality_cube import update_seasonality_cube, CUBE_FILE
+        update_seasonality_cube(data_folder, os.path.join(reports_folder, os.path.basename(CUBE_FILE)))
+
+    print(f"\n[{datetime.now()}] --- L3: Insights ---")
+    L3.generate_insights(reports_folder, insights_folder)
+
+    print(f"\n[{datetime.now()}] Pipeline complete in {datetime.now() - started} ({len(planned)} stocks re-analyzed, {errors} errors).")
+
+def main():
+    """Main function to parse arguments and run the pipeline."""
+    parser = argparse.ArgumentParser(description="Run the L1 -> L2 -> L3 pipeline, re-running only what changed.")
+    parser.add_argument("--data-folder", type=str, default=L2.data_folder, help="Folder with the L1 historical data.")
+    parser.add_argument("--reports-folder", type=str, default=L2.results_folder, help="Folder for the L2 reports.")
+    parser.add_argument("--insights-folder", type=str, default=L3.INSIGHTS_FOLDER, help="Folder for the L3 insights.")
+    parser.add_argument("--state-file", type=str, help=f"Pipeline state file (defaults to {STATE_FILE_NAME} in the reports folder).")
+    parser.add_argument("--skip-fetch", action="store_true", help="Do not fetch new L1 data; use what is on disk.")
+    parser.add_argument("--skip-cube", action="store_true", help="Do not update the seasonality cube.")
+    parser.add_argument("--dry-run", action="store_true", help="Only show the planned work.")
+    parser.add_argument("--full", action="store_true", help="Re-analyze every stock regardless of changes.")
+    parser.add_argument("--symbols", nargs="+", default=(), help="Always re-analyze these symbols.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of L2 worker processes.")
+    parser.add_argument("--compact-reports", action="store_true", help="Write Pareto-pruned compact L2 reports (add --full to convert every report).")
+    args = parser.parse_args()
+
+    run_pipeline(args.data_folder, args.reports_folder, args.insights_folder, args.state_file,
+                 fetch=not args.skip_fetch, dry_run=args.dry_run, full=args.full,
+                 force_symbols=args.symbols, update_cube=not args.skip_cube, workers=args.workers,
+                 compact=args.compact_reports)
+
+if __name__ == "__main__":
+    main()